@@ -17,7 +17,7 @@ def main():
 
     parser = argparse.ArgumentParser(description='Convert Surface formats.')
     parser.add_argument('-curvein', dest='curvein', help='input curve [ucf,vtp,svg]', required=True)
-    parser.add_argument('-curveout', dest='curveout', help='output curve [ucf]', required=True)
+    parser.add_argument('-curveout', dest='curveout', help='output curve [ucf,vtp,dfc]', required=True)
     args = parser.parse_args()
     convert.curve_format(args.curvein, args.curveout)
 
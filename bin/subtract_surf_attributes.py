@@ -17,7 +17,7 @@ def main():
                                                  'Output surface vertices will be the same as the first surface.')
     parser.add_argument('-s1', dest='s1file', help='input surface 1 [ucf,vtp]', required=True)
     parser.add_argument('-s2', dest='s2file', help='input surface 2 [ucf,vtp]', required=True)
-    parser.add_argument('-o', dest='soutfile', help='output surface [ucf,vtp]', required=True)
+    parser.add_argument('-o', dest='soutfile', help='output surface [ucf,vtp,mgh]', required=True)
     args = parser.parse_args()
     subtract_surf_attributes(args.s1file, args.s2file, args.soutfile)
 
@@ -1,34 +1,269 @@
 import numpy as np
-from struct import unpack
+import gzip
 from os import path
 
+# MGH data types as {type code: numpy big-endian dtype}
+MGH_DTYPES = {0: '>u1',
+              1: '>i4',
+              3: '>f4',
+              4: '>i2',
+              }
 
-def load_mgh(filename):
+# Size of the mgh header. The data starts right after it, see load_mgh supplied by Freesurfer (c) MGH
+MGH_HEADER_SIZE = 284
 
-    fobj = open(filename, "rb")
-    ver = unpack('>i', fobj.read(4))[0]
-    dim1 = unpack('>i', fobj.read(4))[0]
-    dim2 = unpack('>i', fobj.read(4))[0]
-    dim3 = unpack('>i', fobj.read(4))[0]
-    frames = unpack('>i', fobj.read(4))[0]
-    datatype = unpack('>i', fobj.read(4))[0]
+# FreeSurfer surface geometry magic numbers
+TRIANGLE_MAGIC = b'\xff\xff\xfe'
+QUAD_MAGIC = b'\xff\xff\xff'
+CURV_MAGIC = b'\xff\xff\xff'
+NEW_QUAD_MAGIC = b'\xff\xff\xfd'
 
-    type_info = {0: (1, 'c'),
-                 1: (4, 'i'),
-                 3: (4, 'f'),
-                 4: (2, 'h'),
-                 }
-    bytes_per_voxel, fmt_string = type_info[datatype]
-    fobj.seek(284)  # Skip the header and jump past the unused bytes. See load_mgh supplied by Freesurfer (c) MGH
-    nvoxels = dim1 * dim2 * dim3 * frames
-    data = np.array(unpack('>' + fmt_string * nvoxels, fobj.read(nvoxels * bytes_per_voxel)), dtype='float32')
-    return data
+
+def load_mgh(filename, frames=None, mmap=False):
+    """Load an mgh/mgz overlay as a flat float32 array, frame after frame.
+    See read_mgh for frames and mmap. With mmap=True the flat big-endian view is returned as is.
+    """
+    data, hdr = read_mgh(filename, frames, mmap)
+    if mmap:
+        return data.reshape(-1)
+    return data.astype('float32').reshape(-1)
 
 
 def readdata(filename):
 
     path_filename, ext = path.splitext(filename)
-    options = {'.mgh': load_mgh}
+    options = {'.mgh': load_mgh,
+               '.mgz': load_mgh,
+               '.thickness': read_morph_data,
+               '.curv': read_morph_data,
+               '.sulc': read_morph_data,
+               '.area': read_morph_data,
+               '.volume': read_morph_data,
+               '.jacobian_white': read_morph_data,
+               '.annot': load_annot,
+               }
     if ext in options:
         data = options[ext](filename)
         return data
+
+
+def writedata(filename, data):
+
+    path_filename, ext = path.splitext(filename)
+    options = {'.mgh': save_mgh,
+               '.mgz': save_mgh,
+               }
+    if ext in options:
+        options[ext](filename, data)
+
+
+def open_mgh(filename, mode='rb'):
+    """Open an mgh file, or an mgz file through a streaming gzip decompressor."""
+    if filename.endswith('.mgz') or filename.endswith('.gz'):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+
+def read_mgh_header(fobj):
+    """Read the leading fields of the mgh header from an open file object."""
+    version, dim1, dim2, dim3, frames, datatype = np.frombuffer(fobj.read(24), dtype='>i4')
+    return {'version': int(version),
+            'dims': (int(dim1), int(dim2), int(dim3)),
+            'frames': int(frames),
+            'type': int(datatype),
+            }
+
+
+def probe_mgh(filename):
+    """Return the dimensions and data type of an mgh/mgz file without reading the data."""
+    with open_mgh(filename) as fobj:
+        hdr = read_mgh_header(fobj)
+    return {'format': 'mgh',
+            'nVertices': hdr['dims'][0] * hdr['dims'][1] * hdr['dims'][2],
+            'nFaces': 0,
+            'nFrames': hdr['frames'],
+            'fields': {'data': np.dtype(MGH_DTYPES[hdr['type']]).name},
+            }
+
+
+def probe_geometry(filename):
+    """Return the number of vertices and faces of a FreeSurfer surface (pial, white, sphere, ...)
+    by reading only its header."""
+    with open(filename, 'rb') as fobj:
+        magic = fobj.read(3)
+        if magic == TRIANGLE_MAGIC:
+            fobj.readline()  # created by ...
+            fobj.readline()
+            nVertices, nFaces = np.frombuffer(fobj.read(8), dtype='>i4')
+        elif magic in (QUAD_MAGIC, NEW_QUAD_MAGIC):
+            counts = np.frombuffer(fobj.read(6), dtype='u1').astype('int32')
+            nVertices = (counts[0] << 16) + (counts[1] << 8) + counts[2]
+            nFaces = (counts[3] << 16) + (counts[4] << 8) + counts[5]
+        else:
+            raise ValueError('File ' + filename + ' is not a FreeSurfer surface')
+    return {'format': 'freesurfer',
+            'nVertices': int(nVertices),
+            'nFaces': int(nFaces),
+            'fields': {},
+            }
+
+
+def read_mgh(filename, frames=None, mmap=False):
+    """Read an mgh file, or an mgz file with streaming decompression.
+    Parameters
+    ----------
+    filename : mgh or mgz file
+    frames   : index or list of indices of the frames to read. All frames are read if None.
+               Only the selected frames are decoded; for mgz the stream is decompressed up to the last one.
+    mmap     : if True, memory map an uncompressed mgh file and return read-only big-endian views
+    Returns
+    -------
+    data     : array (number of frames, dim1 * dim2 * dim3) in the big-endian data type of the file
+    hdr      : dict with version, dims, frames and type
+    """
+    compressed = filename.endswith('.mgz') or filename.endswith('.gz')
+    with open_mgh(filename) as fobj:
+        hdr = read_mgh_header(fobj)
+        dtype = np.dtype(MGH_DTYPES[hdr['type']])
+        nvoxels = hdr['dims'][0] * hdr['dims'][1] * hdr['dims'][2]
+        frame_bytes = nvoxels * dtype.itemsize
+
+        if frames is None:
+            frames = np.arange(hdr['frames'])
+        frames = np.atleast_1d(np.asarray(frames, dtype='int64'))
+        if len(frames) and (frames.min() < 0 or frames.max() >= hdr['frames']):
+            raise IndexError('Frame out of range for ' + filename + ' with ' + str(hdr['frames']) + ' frames')
+
+        if mmap and not compressed:
+            data = np.memmap(filename, dtype=dtype, mode='r', offset=MGH_HEADER_SIZE, shape=(hdr['frames'], nvoxels))
+            if not np.array_equal(frames, np.arange(hdr['frames'])):
+                data = data[frames]
+            return data, hdr
+
+        # Read the selected frames in file order so that the gzip stream only moves forward
+        data = np.empty((len(frames), nvoxels), dtype=dtype)
+        order = np.argsort(frames, kind='mergesort')
+        for ii in order:
+            fobj.seek(MGH_HEADER_SIZE + int(frames[ii]) * frame_bytes)
+            data[ii] = np.frombuffer(fobj.read(frame_bytes), dtype=dtype)
+    return data, hdr
+
+
+def save_mgh(filename, data):
+    """Write per-vertex data to an mgh file, or a gzip compressed mgz file, with a single write.
+    Parameters
+    ----------
+    filename : mgh or mgz file
+    data     : array (vertices,) for one overlay, or (frames, vertices) to store several
+               per-vertex maps as the frames of one file. uint8, int16 and int32 data are
+               stored as is, everything else as float32.
+    """
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[np.newaxis, :]
+    if data.ndim != 2:
+        raise ValueError('Expected an array of (vertices,) or (frames, vertices), got shape ' + str(data.shape))
+
+    mgh_types = dict((np.dtype(dtype).newbyteorder('='), code) for code, dtype in MGH_DTYPES.items())
+    datatype = mgh_types.get(data.dtype.newbyteorder('='), 3)
+    dtype = MGH_DTYPES[datatype]
+    nframes, nvertices = data.shape
+
+    hdr = np.zeros(MGH_HEADER_SIZE, dtype='uint8')
+    # version, dim1, dim2, dim3, frames, type, dof. The ras_good_flag that follows is left at 0.
+    hdr[:28] = np.array([1, nvertices, 1, 1, nframes, datatype, 0], dtype='>i4').view('uint8')
+
+    with open_mgh(filename, 'wb') as fobj:
+        fobj.write(hdr.tobytes() + data.astype(dtype).tobytes())
+
+
+def read_morph_data(filename):
+    """Read a FreeSurfer per-vertex morphometry file (?h.thickness, ?h.curv, ?h.sulc, ...).
+    Returns a float32 array with one value per vertex.
+    """
+    with open(filename, 'rb') as fobj:
+        buf = fobj.read()
+    if buf[:3] == CURV_MAGIC:
+        nvertices, nfaces, vals_per_vertex = np.frombuffer(buf, dtype='>i4', count=3, offset=3)
+        data = np.frombuffer(buf, dtype='>f4', count=nvertices * vals_per_vertex, offset=15)
+        if vals_per_vertex > 1:
+            data = data.reshape(nvertices, vals_per_vertex)
+    else:
+        # Old format: 3 byte vertex and face counts followed by int16 values scaled by 100
+        counts = np.frombuffer(buf, dtype='u1', count=6).astype('int32')
+        nvertices = (counts[0] << 16) + (counts[1] << 8) + counts[2]
+        data = np.frombuffer(buf, dtype='>i2', count=nvertices, offset=6) / 100.0
+    return data.astype('float32')
+
+
+def read_annot(filename):
+    """Read a FreeSurfer annotation (?h.aparc.annot, ...).
+    Returns
+    -------
+    labels : int32 array with the index into ctab of the label of every vertex, -1 for unlabeled vertices
+    ctab   : int32 array (number of labels, 5) with the r, g, b, transparency and annotation value of every label
+    names  : list of the names of the labels
+    """
+    with open(filename, 'rb') as fobj:
+        buf = fobj.read()
+
+    def ints(pos, count=1):
+        return np.frombuffer(buf, dtype='>i4', count=count, offset=pos).astype('int64')
+
+    def string(pos):
+        length = int(ints(pos)[0])
+        return buf[pos + 4:pos + 4 + length].rstrip(b'\x00').decode('latin-1'), pos + 4 + length
+
+    nvertices = int(ints(0)[0])
+    vertex_values = ints(4, 2 * nvertices).reshape(nvertices, 2)
+    values = np.zeros(nvertices, dtype='int64')
+    values[vertex_values[:, 0]] = vertex_values[:, 1]
+    pos = 4 + 8 * nvertices
+
+    entries = []
+    if pos < len(buf) and ints(pos)[0]:
+        pos += 4
+        ctab_version = int(ints(pos)[0])
+        pos += 4
+        if ctab_version > 0:
+            # Old color table format, the version is the number of entries
+            nentries = ctab_version
+            orig_tab, pos = string(pos)
+            for idx in range(nentries):
+                name, pos = string(pos)
+                entries.append((idx, name, ints(pos, 4)))
+                pos += 16
+        else:
+            if -ctab_version != 2:
+                raise ValueError('Color table version ' + str(-ctab_version) + ' in ' + filename + ' not supported')
+            pos += 4  # maximum index
+            orig_tab, pos = string(pos)
+            nentries = int(ints(pos)[0])
+            pos += 4
+            for ii in range(nentries):
+                idx = int(ints(pos)[0])
+                name, pos = string(pos + 4)
+                entries.append((idx, name, ints(pos, 4)))
+                pos += 16
+
+    entries.sort(key=lambda entry: entry[0])
+    names = [name for idx, name, rgbt in entries]
+    ctab = np.zeros((len(entries), 5), dtype='int32')
+    if entries:
+        ctab[:, :4] = np.array([rgbt for idx, name, rgbt in entries])
+        ctab[:, 4] = ctab[:, 0] + (ctab[:, 1] << 8) + (ctab[:, 2] << 16)
+
+    # Map the annotation value of every vertex to its row in ctab
+    labels = -np.ones(nvertices, dtype='int32')
+    if entries:
+        order = np.argsort(ctab[:, 4], kind='mergesort')
+        pos = np.clip(np.searchsorted(ctab[order, 4], values), 0, len(order) - 1)
+        found = ctab[order[pos], 4] == values
+        labels[found] = order[pos[found]]
+    return labels, ctab, names
+
+
+def load_annot(filename):
+    """Load the per-vertex label indices of a FreeSurfer annotation, see read_annot."""
+    labels, ctab, names = read_annot(filename)
+    return labels
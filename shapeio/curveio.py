@@ -9,10 +9,14 @@ __email__ = "s.joshi@ucla.edu"
 import os
 import sys
 import numpy as np
+from collections import OrderedDict
 import dfcio
 import vtkio
-import bs4
-from svg.path import parse_path
+import ucfio
+import mincobjio
+from curveset import CurveSet
+import xml.etree.ElementTree as ElementTree
+from svg.path import parse_path, Move, Line, Close, QuadraticBezier, CubicBezier, Arc
 
 
 def ReadUCFMultipleLevelsWithData(filename):
@@ -25,72 +29,21 @@ def ReadUCFMultipleLevelsWithData(filename):
     X         : array of surfaces/curves
     atributes : float array of data values
     """
-    #sys.stdout.write('Reading UCF file ' + filename+'...')
-    fid = open(filename,'rt')
-    dummy = ''
-    # Read all the preamble till you reach contour_data
-    while dummy != '<levels>':
-        dummy = fid.readline().rstrip('\n')
-        dummy = dummy.rstrip()
-    # The next line is the number of levels
-    num_levels = int(fid.readline().rstrip('\n'))
-
-    X = []
-    attributes = []
-    for ctr in np.arange(0,num_levels):
-        while dummy != '<point_num=>':
-            dummy = fid.readline().rstrip('\n');
-            dummy=dummy.rstrip()
-        N = int(fid.readline().rstrip('\n'))
-        dummy = fid.readline()
-        Xtemp = [fid.readline().rstrip().split() for i in np.arange(0,N)]
-
-        Xtemp = np.array(Xtemp,dtype=float)
-
-        X.append(np.array(Xtemp[:,0:3]))
-        if Xtemp.shape[1] == 4:
-            attributes.append(np.array(Xtemp[:,3]))
-
-    sys.stdout.write('Done.\n')
-    fid.close()
-    return X,attributes
+    return ucfio.read_ucf_levels(filename)
 
 
 def ReadMincObjCurve(filename):
 
-    X = []
-    fid = open(filename,'rt')
-    shape_type = fid.readline().split()
-    if shape_type[0] == 'P':
+    obj = mincobjio.read_mincobj(filename)
+    if obj.type == 'P':
         sys.stdout.write('This curve file ' + filename + ' contains an obj surface. Exiting without reading...\n')
-        X = []
-        return X
-    elif shape_type[0] == 'L':
-        num_pts = int(shape_type[-1])
-        # Read points
-        # coords = []
-        coords = np.empty((3,num_pts))
-        for i in range(0,num_pts):
-            line_split = fid.readline().split()
-            coords[:,i] = [float(line_split[0]),float(line_split[1]),float(line_split[2])]
-
-        num_lines = int(fid.readline())
-        dummy = fid.readline()
-        # Read the indices of the points
-        lines = [line.rstrip('\n') for line in fid.readlines()]
-        lines = " ".join(lines)
-        idx = [int(x) for x in lines.split()]
-        idx_start = idx[0:num_lines]
-        idx = idx[num_lines:]
-
-        # Format the curves
-        idx_start.insert(0,0)
-        for i in range(0,num_lines):
-            X.append(coords[:,range(idx_start[i],idx_start[i+1])])
-
-        attributes = []
+        return [], [], False
 
-        return X,attributes
+    X = np.split(obj.vertices[obj.indices], obj.offsets[1:-1])
+    attributes = []
+    if len(X) == 1:
+        return X[0], attributes, False
+    return X, attributes, True
 
 
 def readcurve(filename):
@@ -105,7 +58,7 @@ def readcurve(filename):
         return nCurves,attributes,isMultilevelUCF
 
     def vtp(filename):
-        print("to be implemented")
+        return read_vtp_curveset(filename).to_curve()
 
     def ucf(filename):
         X,attributes = ReadUCFMultipleLevelsWithData(filename)
@@ -151,105 +104,50 @@ def readcurve(filename):
         sys.stdout.write("Input format " + ext + " not supported. Exiting without saving.\n")
         return None
 
-def WriteUCF(coords,attriblabel,attributes,filename):
-    T = coords.shape[0]
-    attrib_flag = False
-    if len(attributes) != 0:
-        if len(attributes) == T:
-            attrib_flag = True
-        else:
-            sys.stdout.write("Mismatch in the length of attributes and the length of vertices of the mesh\n")
-            return None
-
-    sys.stdout.write('Writing ucf file ' + filename + '...')
-    f = open(filename,'wt')
-    f.write('#UCF created by surfio\n')
-    f.write('<width=>\n')
-    f.write('64\n')
-    f.write('<height=>\n')
-    f.write('146\n')
-    f.write('<xrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<yrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<zrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<levels>\n');
-    f.write('1\n');
-    f.write('<level number=>\n');
-    f.write('0.0000\n');
-    f.write('<point_num=>\n');
-    f.write("{0:d}\n".format(T));
-    f.write('<contour_data=>\n');
-
-    if attrib_flag:
-        for i in np.arange(0,T):
-            f.write("{0:f} {1:f} {2:f} {3:f}\n".format(float(coords[i,0]),float(coords[i,1]),float(coords[i,2]),float(attributes[i])))
-    else:
-        for i in np.arange(0,T):
-            f.write("{0:f} {1:f} {2:f}\n".format(float(coords[i,0]),float(coords[i,1]),float(coords[i,2])))
+def read_vtp_curveset(filename):
+    """Read the polylines of a vtp file into a CurveSet. The 'Attributes' point array written by
+    vtkio.write_multilevel_polyline_to_vtp, or else the first scalar point array, is stored as the
+    attributes of the curves, and the other scalar point arrays under their own names."""
+    coords, offsets, point_data = vtkio.ReadVTK_XML_Polydata_lines(filename)
+    scalars = [name for name in point_data if point_data[name].ndim == 1]
+    attributes = OrderedDict()
+    if scalars:
+        primary = 'Attributes' if 'Attributes' in scalars else scalars[0]
+        attributes['attributes'] = point_data[primary]
+        for name in scalars:
+            if name != primary:
+                attributes[name] = point_data[name]
+    return CurveSet(coords, offsets, attributes)
+
+
+def readcurveset(filename):
+    """Read a curve file into a CurveSet. ucf, dfc, vtp and obj files are read directly into a single buffer
+    with level offsets, the other formats are converted from the output of readcurve."""
+    path_filename,ext = os.path.splitext(filename)
+    if ext == '.ucf':
+        coords, attributes, offsets = ucfio.read_ucf_buffer(filename)
+        return CurveSet(coords, offsets, attributes)
+    if ext == '.dfc':
+        coords, offsets, hdr = dfcio.readdfc_buffer(filename)
+        return CurveSet(coords, offsets)
+    if ext == '.vtp':
+        return read_vtp_curveset(filename)
+    if ext == '.obj':
+        obj = mincobjio.read_mincobj(filename)
+        if obj.type == 'L':
+            return CurveSet(obj.vertices[obj.indices], obj.offsets)
+    curve = readcurve(filename)
+    if curve is None:
+        return None
+    return CurveSet.from_curve(*curve)
 
-    f.write('<end of level>\n')
-    f.write('<end>\n');
-    f.close()
-    sys.stdout.write("Done.\n")
+def WriteUCF(coords,attriblabel,attributes,filename,precision=6):
+    attributes_list = [attributes] if len(attributes) else []
+    ucfio.write_ucf(filename,[np.asarray(coords)],attributes_list,precision)
 
-def WriteUCFMultipleLevelsWithData(filename,coords,attributes):
+def WriteUCFMultipleLevelsWithData(filename,coords,attributes,precision=6):
     # coords and attributes are now lists
-
-    N = len(coords)
-    T = len(coords[0])
-    attrib_flag = False
-    if len(attributes):
-        L = len(attributes[0])
-        if L == T:
-            attrib_flag = True
-        else:
-            sys.stdout.write("Mismatch in the length of attributes and the length of vertices of the mesh\n")
-            return None
-    else:
-        L = 0
-
-    # if data is less than 3 dimensional, convert it to 3D
-    #TBD
-
-    sys.stdout.write('Writing ucf file ' + filename + '...')
-    f = open(filename,'wt')
-    f.write('#UCF created by surfio\n')
-    f.write('<width=>\n')
-    f.write('64\n')
-    f.write('<height=>\n')
-    f.write('146\n')
-    f.write('<xrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<yrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<zrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<levels>\n');
-    f.write('{0:d}\n'.format(N));
-
-    for ii in range(0,N):
-        f.write('<level number=>\n');
-        f.write('{0:f}\n'.format(ii));
-        f.write('<point_num=>\n');
-        f.write("{0:d}\n".format(len(coords[ii])));
-        f.write('<contour_data=>\n');
-
-        if attrib_flag:
-            for jj in range(0,len(coords[ii])):
-                f.write("{0:f} {1:f} {2:f} {3:f}\n".format(float(coords[ii][jj][0]),float(coords[ii][jj][1]),float(coords[ii][jj][2]),float(attributes[ii][jj])))
-        else:
-            for jj in np.arange(0,len(coords[ii])):
-                f.write("{0:f} {1:f} {2:f}\n".format(float(coords[ii][jj][0]),float(coords[ii][jj][1]),float(coords[ii][jj][2])))
-
-        f.write('<end of level>\n')
-
-
-    f.write('<end>\n');
-    f.close()
-    sys.stdout.write("Done.\n")
-    return
+    ucfio.write_ucf(filename,coords,attributes,precision)
 
 def write_vtp_XMLPolydata(filename, coords, attributes = []):
 
@@ -302,37 +200,97 @@ def write_vtp_XMLPolydata(filename, coords, attributes = []):
     fid.close()
     return
 
-def ReadSVG(filename):
-
-    soup = bs4.BeautifulSoup(open(filename))
-
-    # Select the maximum length curve
-    all_paths = soup.findAll('path')
-    maxlength = len(str(all_paths[0]))
-    maxidx = 0
-    for i in range(1,len(all_paths)):
-        if maxlength < len(str(all_paths[i])):
-            maxlength = len(str(all_paths[i]))
-            maxidx = i
-    maxpath = all_paths[maxidx]
-
-    path_d = maxpath['d']
-
-    path1 = parse_path(path_d)
-    X = np.empty((100,3))
-    ctr = 0
-    for i in np.linspace(0,1,100):
-        X[ctr,0] = path1.point(i).real
-        X[ctr,1] = path1.point(i).imag
-        X[ctr,2] = 0.0
-        ctr += 1
+def iter_svg_paths(filename):
+    """Iterate over the path data (the d attribute) of the path elements of an SVG file.
+    The file is parsed incrementally and each element is discarded once it has been read."""
+    for event, elem in ElementTree.iterparse(filename, events=('end',)):
+        if elem.tag == 'path' or elem.tag.endswith('}path'):
+            d = elem.get('d')
+            if d:
+                yield d
+        elem.clear()
+
+
+def _svg_segment_points(segment, t):
+    """Evaluate an svg.path segment at an array of parameters t in [0, 1]. Returns a complex array."""
+    if isinstance(segment, (Line, Close)):
+        return segment.start + (segment.end - segment.start) * t
+    if isinstance(segment, QuadraticBezier):
+        return (1 - t)**2 * segment.start + 2 * (1 - t) * t * segment.control + t**2 * segment.end
+    if isinstance(segment, CubicBezier):
+        return ((1 - t)**3 * segment.start + 3 * (1 - t)**2 * t * segment.control1 +
+                3 * (1 - t) * t**2 * segment.control2 + t**3 * segment.end)
+    if isinstance(segment, Arc) and segment.start != segment.end and \
+            segment.radius.real != 0 and segment.radius.imag != 0:
+        angle = np.radians(segment.theta + segment.delta * t)
+        rotation = np.radians(segment.rotation)
+        radius = segment.radius * getattr(segment, 'radius_scale', 1.0)
+        x = np.cos(rotation) * np.cos(angle) * radius.real - np.sin(rotation) * np.sin(angle) * radius.imag
+        y = np.sin(rotation) * np.cos(angle) * radius.real + np.cos(rotation) * np.sin(angle) * radius.imag
+        return segment.center + x + 1j * y
+    return np.array([segment.point(ti) for ti in t])
+
+
+def sample_svg_path(path_d, num_points=100, samples_per_segment=64):
+    """Sample an SVG path at num_points uniformly spaced in arc length.
+    Parameters
+    ----------
+    path_d              : path data (the d attribute of a path element)
+    num_points          : number of samples
+    samples_per_segment : number of samples of each segment used to estimate the arc length
+    Returns
+    -------
+    X                   : (num_points, 3) array, z is 0
+    length              : arc length of the path
+    """
+    t = np.linspace(0, 1, samples_per_segment)
+    segments = [segment for segment in parse_path(path_d) if not isinstance(segment, Move)]
+    if not segments:
+        return np.zeros((num_points, 3)), 0.0
+    points = np.concatenate([_svg_segment_points(segment, t) for segment in segments])
+
+    steps = np.abs(np.diff(points))
+    keep = np.concatenate([[True], steps > 0])
+    points = points[keep]
+    arclength = np.concatenate([[0.0], np.cumsum(steps[steps > 0])])
+
+    X = np.zeros((num_points, 3))
+    s = np.linspace(0, arclength[-1], num_points)
+    X[:, 0] = np.interp(s, arclength, points.real)
+    X[:, 1] = np.interp(s, arclength, points.imag)
+    return X, arclength[-1]
+
+
+def ReadSVG(filename, num_points=100, all_paths=False):
+    """Read the paths of an SVG file as curves sampled uniformly in arc length.
+    Parameters
+    ----------
+    filename   : SVG file
+    num_points : number of points of each curve
+    all_paths  : return every path as a level of a multilevel curve instead of only the longest path
+    Returns
+    -------
+    X, attributes, isMultilevelUCF
+    """
+    curves = [sample_svg_path(path_d, num_points) for path_d in iter_svg_paths(filename)]
+    if not curves:
+        sys.stdout.write('No paths found in ' + filename + '\n')
+        return [], [], False
 
     attributes = []
+    if all_paths and len(curves) > 1:
+        return [X for X, length in curves], attributes, True
+
+    # Select the curve of maximum arc length
+    X = max(curves, key=lambda curve: curve[1])[0]
     isMultilevelUCF = False
     return X, attributes, isMultilevelUCF
 
 
-def writecurve(filename, coords, attributes=[], isMultilevelUCF=False):
+def writecurve(filename, coords, attributes=[], isMultilevelUCF=False, encoding='ascii', compress=False):
+
+    if isinstance(coords, CurveSet):
+        coords, attributes, isMultilevelUCF = coords.to_curve()
 
     def ucf(filename):
         if isMultilevelUCF:
@@ -341,12 +299,16 @@ def writecurve(filename, coords, attributes=[], isMultilevelUCF=False):
             WriteUCF(coords,'',attributes,filename)
 
     def vtp(filename):
-        vtkio.write_multilevel_polyline_to_vtp(filename, coords, attributes)
+        vtkio.write_multilevel_polyline_to_vtp(filename, coords, attributes, encoding, compress)
+
+    def dfc(filename):
+        dfcio.writedfc(filename, coords)
 
     path_filename,ext = os.path.splitext(filename)
 
     options = {'.ucf': ucf,
                '.vtp': vtp,
+               '.dfc': dfc,
               }
 
     if ext in options:
@@ -371,6 +333,9 @@ class Curve(object):
     def write(self, filename):
         writecurve(filename, self.coords, self.attributes, self.isMultilevelUCF)
 
+    def curveset(self):
+        return CurveSet.from_curve(self.coords, self.attributes, self.isMultilevelUCF)
+
     @staticmethod
     def readfile(filename):
         coords, attributes, isMultilevelUCF = readcurve(filename)
@@ -0,0 +1,214 @@
+""" This module implements CurveSet, a compact container for a set of curves (the levels of a multilevel
+    UCF, the contours of a DFC file or the paths of an SVG file) stored as one contiguous coordinate
+    buffer with level offsets.
+"""
+
+__author__ = "Shantanu H. Joshi"
+__copyright__ = "Copyright 2013, Shantanu H. Joshi Ahmanson-Lovelace Brain Mapping Center, \
+                 University of California Los Angeles"
+__email__ = "s.joshi@ucla.edu"
+
+import numpy as np
+from collections import OrderedDict
+import vtkio
+
+
+def resample_curves(coords, offsets, num_points=100):
+    """Resample every curve of a buffer plus offsets at num_points spaced uniformly in arc length.
+    All the curves are interpolated in one pass: each point gets the key 2 * level + its normalized
+    arc length, so a single searchsorted over the keys locates the segment of every target sample.
+    Parameters
+    ----------
+    coords     : (N, 3) array of the points of all curves
+    offsets    : (nCurves + 1,) array, curve i is coords[offsets[i]:offsets[i+1]]
+    num_points : number of samples of each curve
+    Returns
+    -------
+    X          : float array (nCurves, num_points, 3), NaN for curves without points. Curves of a
+                 single point or of zero length repeat their first point.
+    """
+    coords = np.asarray(coords, dtype='float64').reshape(-1, 3)
+    offsets = np.asarray(offsets, dtype='int64')
+    counts = np.diff(offsets)
+    X = np.full((len(counts), num_points, 3), np.nan)
+    levels = np.flatnonzero(counts > 0)
+    if len(levels) == 0:
+        return X
+
+    level = np.repeat(np.arange(len(counts)), counts)
+    start = np.repeat(offsets[:-1], counts)
+    steps = np.zeros(len(coords))
+    steps[1:] = np.linalg.norm(np.diff(coords, axis=0), axis=1)
+    steps[offsets[levels]] = 0
+    arclength = np.cumsum(steps)
+    arclength -= arclength[start]
+    lengths = np.zeros(len(counts))
+    lengths[levels] = arclength[offsets[levels + 1] - 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        u = np.where(lengths[level] > 0, arclength / lengths[level], 0.0)
+    keys = 2 * level + u
+
+    target = (2 * levels[:, None] + np.linspace(0, 1, num_points)[None, :]).ravel()
+    first = np.repeat(offsets[levels], num_points)
+    last = np.repeat(offsets[levels + 1] - 1, num_points)
+    idx0 = np.clip(np.searchsorted(keys, target, side='right') - 1, first, np.maximum(last - 1, first))
+    idx1 = np.minimum(idx0 + 1, last)
+    denom = keys[idx1] - keys[idx0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.clip(np.where(denom > 0, (target - keys[idx0]) / denom, 0.0), 0, 1)
+    X[levels] = (coords[idx0] + frac[:, None] * (coords[idx1] - coords[idx0])).reshape(len(levels), num_points, 3)
+    return X
+
+
+class CurveSet(object):
+    """A set of curves stored as a float32 (N, 3) buffer and an offsets array. Level i is
+    coords[offsets[i]:offsets[i+1]]. attributes is an OrderedDict of per-point (N,) buffers
+    parallel to coords; the data values of UCF files are stored under 'attributes'.
+    """
+    __slots__ = ('coords', 'offsets', 'attributes')
+
+    def __init__(self, coords=None, offsets=None, attributes=None):
+        self.coords = np.ascontiguousarray(np.zeros((0, 3)) if coords is None else coords, dtype='float32').reshape(-1, 3)
+        if offsets is None:
+            offsets = [0, len(self.coords)]
+        self.offsets = np.asarray(offsets, dtype='int64')
+        if attributes is None:
+            attributes = OrderedDict()
+        elif not isinstance(attributes, dict):
+            attributes = OrderedDict([('attributes', attributes)])
+        self.attributes = OrderedDict((name, np.asarray(values, dtype='float32')) for name, values in attributes.items())
+        if self.offsets[0] != 0 or self.offsets[-1] != len(self.coords) or np.any(np.diff(self.offsets) < 0):
+            raise ValueError('Offsets do not describe a partition of the ' + str(len(self.coords)) + ' points')
+        for name, values in self.attributes.items():
+            if len(values) != len(self.coords):
+                raise ValueError('Attribute ' + name + ' length ' + str(len(values)) +
+                                 ' not the same as the number of points ' + str(len(self.coords)))
+
+    @staticmethod
+    def from_list(coords_list, attributes_list=[]):
+        """Build a CurveSet from a list of (N, 3) arrays and an optional list of per-level data values."""
+        coords_list = [vtkio.tall_coords(coords).reshape(-1, 3) for coords in coords_list]
+        offsets = np.zeros(len(coords_list) + 1, dtype='int64')
+        np.cumsum([len(coords) for coords in coords_list], out=offsets[1:])
+        coords = np.concatenate(coords_list) if coords_list else None
+        attributes = None
+        if len(attributes_list) == len(coords_list) and len(attributes_list):
+            attributes = np.concatenate([np.ravel(values) for values in attributes_list])
+        return CurveSet(coords, offsets, attributes)
+
+    @staticmethod
+    def from_curve(coords, attributes=[], isMultilevelUCF=False):
+        """Build a CurveSet from the (coords, attributes, isMultilevelUCF) returned by curveio.readcurve."""
+        if isinstance(coords, CurveSet):
+            return coords
+        if isMultilevelUCF or isinstance(coords, (list, tuple)):
+            return CurveSet.from_list(list(coords), attributes)
+        return CurveSet.from_list([coords], [attributes] if len(attributes) else [])
+
+    def to_list(self, name='attributes'):
+        """Return the levels as a list of (N, 3) views and the list of views of the named attribute,
+        empty if the attribute is absent."""
+        coords_list = np.split(self.coords, self.offsets[1:-1])
+        if name not in self.attributes:
+            return coords_list, []
+        return coords_list, np.split(self.attributes[name], self.offsets[1:-1])
+
+    def to_curve(self):
+        """Return (coords, attributes, isMultilevelUCF) in the form returned by curveio.readcurve."""
+        coords_list, attributes_list = self.to_list()
+        if len(self) == 0:
+            return [], [], True
+        if len(self) == 1:
+            return coords_list[0], attributes_list[0] if attributes_list else [], False
+        return coords_list, attributes_list, True
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, level):
+        """Return a view of the (N, 3) coordinates of a level, or for a slice of levels a CurveSet
+        whose coordinates and attributes are views of this one."""
+        if isinstance(level, slice):
+            start, stop, step = level.indices(len(self))
+            if step != 1:
+                raise IndexError('Only contiguous slices of levels are supported')
+            stop = max(start, stop)
+            first, last = self.offsets[start], self.offsets[stop]
+            return CurveSet(self.coords[first:last], self.offsets[start:stop + 1] - first,
+                            OrderedDict((name, values[first:last]) for name, values in self.attributes.items()))
+        if level < 0:
+            level += len(self)
+        if level < 0 or level >= len(self):
+            raise IndexError('Level index out of range for ' + str(len(self)) + ' levels')
+        return self.coords[self.offsets[level]:self.offsets[level + 1]]
+
+    def __iter__(self):
+        for level in range(len(self)):
+            yield self[level]
+
+    def __repr__(self):
+        return 'CurveSet(nLevels={0}, nPoints={1}, attributes={2})'.format(len(self), len(self.coords),
+                                                                           list(self.attributes.keys()))
+
+    def level_attributes(self, level, name='attributes'):
+        """Return a view of the named attribute values of a level."""
+        if level < 0:
+            level += len(self)
+        return self.attributes[name][self.offsets[level]:self.offsets[level + 1]]
+
+    @property
+    def counts(self):
+        """Number of points of each level."""
+        return np.diff(self.offsets)
+
+    @property
+    def level_index(self):
+        """Level of each point, an int64 array (N,)."""
+        return np.repeat(np.arange(len(self)), self.counts)
+
+    def reduce(self, values=None, ufunc=np.add, empty=0):
+        """Reduce per-point values over each level with a single ufunc.reduceat call.
+        Parameters
+        ----------
+        values : (N, ...) array, the coordinates if None
+        ufunc  : numpy ufunc, for example np.add, np.minimum or np.maximum
+        empty  : value of levels without points
+        Returns
+        -------
+        (nLevels, ...) array
+        """
+        values = self.coords if values is None else np.asarray(values)
+        counts = self.counts
+        nonempty = counts > 0
+        out = np.full((len(self),) + values.shape[1:], empty, dtype=np.result_type(values, type(empty)))
+        if np.any(nonempty):
+            out[nonempty] = ufunc.reduceat(values, self.offsets[:-1][nonempty], axis=0)
+        return out
+
+    def sum(self, values=None):
+        return self.reduce(values, np.add)
+
+    def mean(self, values=None):
+        """Mean of per-point values over each level, the centroid of each level if values is None."""
+        counts = self.counts
+        sums = self.reduce(values, np.add).astype('float64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts.reshape((-1,) + (1,) * (sums.ndim - 1))
+
+    def min(self, values=None):
+        return self.reduce(values, np.minimum, np.nan)
+
+    def max(self, values=None):
+        return self.reduce(values, np.maximum, np.nan)
+
+    def resample(self, num_points=100):
+        """Resample every level at num_points spaced uniformly in arc length, a (nLevels, num_points, 3) array."""
+        return resample_curves(self.coords, self.offsets, num_points)
+
+    def lengths(self):
+        """Arc length of each level."""
+        steps = np.zeros(len(self.coords))
+        steps[1:] = np.linalg.norm(np.diff(self.coords.astype('float64'), axis=0), axis=1)
+        # The step into the first point of a level joins two levels and is not part of either
+        steps[self.offsets[:-1][self.offsets[:-1] < len(steps)]] = 0
+        return self.reduce(steps, np.add)
@@ -8,48 +8,254 @@ __copyright__ = "Copyright 2013, Brandon Ayers, Ahmanson-Lovelace Brain Mapping
 __email__ = "s.joshi@ucla.edu"
 
 import numpy as np
-import struct
 import os
 import sys
+import mmap
+from multiprocessing.pool import ThreadPool
+import curveset
 
 
-def readdfc(filename):
+# Layout of the DFC header
+DFC_HEADER_DTYPE = np.dtype([('magic', 'S8'),
+                             ('version', 'S4'),
+                             ('hdrsize', '<i4'),
+                             ('dataStart', '<i4'),
+                             ('mdoffset', '<i4'),
+                             ('pdoffset', '<i4'),
+                             ('nContours', '<i4'),
+                             ])
+
+
+def readdfc_header(fid):
+    """Parse the DFC header and the XML metadata from an open file object.
+    Returns a hdr class with the same fields as readdfc.
+    """
     class hdr:
         pass
 
-    class NFV:
-        pass
+    fid.seek(0, os.SEEK_SET)
+    raw = np.frombuffer(fid.read(DFC_HEADER_DTYPE.itemsize), dtype=DFC_HEADER_DTYPE, count=1)
+    hdr.magic = np.frombuffer(raw['magic'][0].ljust(8, b'\x00'), dtype='S1')
+    hdr.version = np.frombuffer(raw['version'][0].ljust(4, b'\x00'), dtype='S1')
+    for field in DFC_HEADER_DTYPE.names[2:]:
+        setattr(hdr, field, raw[field].astype('int32'))
+
+    fid.seek(int(hdr.mdoffset[0]), os.SEEK_SET)
+    hdr.xmlstr = fid.read(int(hdr.dataStart[0] - hdr.mdoffset[0])).decode('latin-1')
+    return hdr
 
-    Curves = []
 
+def readdfc_index(words, nContours):
+    """Walk the contour headers of the data section of a DFC file held in memory.
+    Parameters
+    ----------
+    words     : the data section viewed as little endian int32 words
+    nContours : number of contours to walk from the start of the data section
+    Returns
+    -------
+    counts    : int64 array (nContours,), the number of points of every contour
+    starts    : int64 array (nContours,), the word index of the first coordinate of every contour
+    """
+    counts = []
+    starts = []
+    pos = 0
+    for ctno in range(0, nContours):
+        if pos >= len(words):
+            raise ValueError('DFC data section is truncated after ' + str(ctno) + ' contours')
+        count = int(words[pos])
+        counts.append(count)
+        starts.append(pos + 1)
+        pos += 1 + 3 * count
+    return np.array(counts, dtype='int64'), np.array(starts, dtype='int64')
+
+
+def _map_dfc(filename):
+    """Memory map a DFC file. Returns the header and the data section as little endian int32 words,
+    so that walking the contour headers only touches the pages that hold them."""
     with open(filename, 'rb') as fid:
-        hdr.magic = np.array(struct.unpack('c' * 8, fid.read(8)), dtype='S1')
-        hdr.version = np.array(struct.unpack('c' * 4, fid.read(4)), dtype='S1')
-        hdr.hdrsize = np.array(struct.unpack('i', fid.read(4)), dtype='int32')  # size(int32) = 4 bytes
-        hdr.dataStart = np.array(struct.unpack('i', fid.read(4)), dtype='int32')  # size(int32) = 4 bytes
-        hdr.mdoffset = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-        hdr.pdoffset = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-        hdr.nContours = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-
-        fid.seek(hdr.mdoffset, os.SEEK_SET)
-        Mdata = struct.unpack('c' * (hdr.dataStart - hdr.mdoffset), fid.read(hdr.dataStart - hdr.mdoffset))
-        hdr.xmlstr = "".join(Mdata)
-
-        fid.seek(hdr.dataStart, os.SEEK_SET)
-        for ctno in np.arange(0, hdr.nContours):
-            nopts = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-
-            XYZ = np.array(struct.unpack('f' * 3 * nopts, fid.read(4 * 3 * nopts)), dtype='float')
-            XYZ = np.transpose(np.reshape(XYZ, (3, nopts), order='F'))
-            Curves.append(XYZ)
-
-    if len(Curves) == 28:
+        hdr = readdfc_header(fid)
+        mm = mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+    start = int(hdr.dataStart[0])
+    return hdr, np.frombuffer(mm, dtype='<i4', count=(len(mm) - start) // 4, offset=start)
+
+
+def probedfc(filename):
+    """Return the number of contours and points of a DFC file without reading the coordinates."""
+    hdr, words = _map_dfc(filename)
+    counts, starts = readdfc_index(words, int(hdr.nContours[0]))
+    return {'format': 'dfc',
+            'nVertices': int(counts.sum()),
+            'nFaces': 0,
+            'nContours': len(counts),
+            'fields': {},
+            }
+
+
+def readdfc_buffer(filename):
+    """Read all the contours of a DFC file with a single read of the data section.
+    Parameters
+    ----------
+    filename : DFC file
+    Returns
+    -------
+    coords   : float32 array (N, 3) of the points of all contours, one after the other
+    offsets  : int64 array (nContours + 1), contour i is coords[offsets[i]:offsets[i+1]]
+    hdr      : header
+    """
+    with open(filename, 'rb') as fid:
+        hdr = readdfc_header(fid)
+        fid.seek(int(hdr.dataStart[0]), os.SEEK_SET)
+        data = fid.read()
+
+    # Every contour is stored as an int32 point count followed by the x, y, z float32 values of its points.
+    # Walk the counts on the section viewed as 4 byte words, then drop them to get the coordinates.
+    words = np.frombuffer(data, dtype='<i4', count=len(data) // 4)
+    counts, starts = readdfc_index(words, int(hdr.nContours[0]))
+    nContours = len(counts)
+    pos = int(starts[-1] + 3 * counts[-1]) if nContours else 0
+    if pos > len(words):
+        raise ValueError('DFC data section of ' + filename + ' is truncated')
+    mask = np.ones(pos, dtype=bool)
+    mask[starts - 1] = False
+    coords = words[:pos][mask].view('<f4').reshape(-1, 3)
+    offsets = np.zeros(nContours + 1, dtype='int64')
+    np.cumsum(counts, out=offsets[1:])
+    return coords, offsets, hdr
+
+
+def readdfc_contour(filename, ctno):
+    """Read a single contour from a DFC file without decoding the others.
+    Returns a float32 array (N, 3). Contours of an already loaded readdfc_buffer result are
+    available as coords[offsets[ctno]:offsets[ctno+1]].
+    """
+    hdr, words = _map_dfc(filename)
+    if ctno < 0 or ctno >= hdr.nContours[0]:
+        raise IndexError('Contour ' + str(ctno) + ' out of range for ' + filename +
+                         ' with ' + str(hdr.nContours[0]) + ' contours')
+    counts, starts = readdfc_index(words, ctno + 1)
+    start, nopts = int(starts[ctno]), int(counts[ctno])
+    return words[start:start + 3 * nopts].view('<f4').reshape(nopts, 3).copy()
+
+
+# Number of curves of the BrainSuite tracing protocols
+DFC_PROTOCOLS = (28, 26)
+
+
+def dfc_protocol(nContours, filename):
+    """Return the BrainSuite tracing protocol (28 or 26 curves) matching the number of contours, or None."""
+    if nContours == 28:
         sys.stdout.write('This file ' + filename + ' is traced using a 28 curve protocol\n')
-    elif len(Curves) == 26:
+        return 28
+    elif nContours == 26:
         sys.stdout.write('This file ' + filename + ' is traced using a 26 curve protocol\n')
+        return 26
     else:
         sys.stdout.write('This file ' + filename + ' is traced using an unknown protocol with ' +
-                         len(Curves) + ' number of curves. Now Exiting...\n')
+                         str(nContours) + ' number of curves. Now Exiting...\n')
+        return None
+
+
+def _read_ncontours(filename):
+    """Return the number of contours stored in the fixed size header of a DFC file."""
+    with open(filename, 'rb') as fid:
+        return int(np.fromfile(fid, dtype=DFC_HEADER_DTYPE, count=1)['nContours'][0])
+
+
+def read_dfc_cohort(filelist, num_points=100, workers=8, memmap=None):
+    """Read the curves of a cohort of DFC files traced with the same protocol into a single array.
+    The protocol is checked from the fixed size header of every file first, then the files are read
+    in parallel and every curve is resampled to num_points uniformly spaced in arc length.
+    Parameters
+    ----------
+    filelist   : list of DFC files, one per subject
+    num_points : number of points of each curve
+    workers    : number of files read concurrently
+    memmap     : optional .npy file, the output is then a memory-mapped array backed by this file
+    Returns
+    -------
+    X          : float32 array (subjects, curves, num_points, 3)
+    """
+    pool = ThreadPool(workers)
+    try:
+        nContours = pool.map(_read_ncontours, filelist)
+        protocols = set(nContours)
+        if len(protocols) > 1:
+            groups = dict((n, [f for f, m in zip(filelist, nContours) if m == n]) for n in protocols)
+            raise ValueError('The files are traced with different protocols: ' +
+                             ', '.join(str(n) + ' curves in ' + str(len(files)) + ' files (' + files[0] + ')'
+                                       for n, files in sorted(groups.items())))
+        nCurves = nContours[0] if nContours else 0
+        if filelist and nCurves not in DFC_PROTOCOLS:
+            raise ValueError('The files are traced using an unknown protocol with ' + str(nCurves) + ' curves')
+
+        shape = (len(filelist), nCurves, num_points, 3)
+        if memmap is not None:
+            X = np.lib.format.open_memmap(memmap, mode='w+', dtype='float32', shape=shape)
+        else:
+            X = np.empty(shape, dtype='float32')
+
+        def read_subject(ii):
+            coords, offsets, hdr = readdfc_buffer(filelist[ii])
+            X[ii] = curveset.resample_curves(coords, offsets, num_points)
+
+        pool.map(read_subject, range(len(filelist)))
+    finally:
+        pool.close()
+
+    if memmap is not None:
+        X.flush()
+    return X
+
+
+def readdfc(filename):
+    coords, offsets, hdr = readdfc_buffer(filename)
+    Curves = np.split(coords.astype('float'), offsets[1:-1])
+
+    if dfc_protocol(len(Curves), filename) is None:
         return
 
     return Curves, hdr
+
+
+def writedfc(filename, Curves, xmlstr=''):
+    """Write a list of curves to a DFC file.
+    The header and XML metadata are written in one buffer and all the contours in another.
+    Parameters
+    ----------
+    filename : DFC file
+    Curves   : list of arrays (N, 3), a single array for a file with one contour, or a CurveSet
+    xmlstr   : XML metadata string, for example hdr.xmlstr of a file read with readdfc
+    """
+    if isinstance(Curves, curveset.CurveSet):
+        Curves = Curves.to_list()[0]
+    if not isinstance(Curves, (list, tuple)):
+        Curves = [Curves]
+    Curves = [np.asarray(XYZ, dtype='<f4') for XYZ in Curves]
+    Curves = [XYZ.T if XYZ.shape[1] != 3 else XYZ for XYZ in Curves]
+    counts = np.array([XYZ.shape[0] for XYZ in Curves], dtype='int64')
+    nContours = len(Curves)
+
+    # Lay out every contour as its int32 point count followed by its x, y, z float32 values
+    count_pos = np.zeros(nContours, dtype='int64')
+    np.cumsum(1 + 3 * counts[:-1], out=count_pos[1:])
+    data = np.empty(int(np.sum(1 + 3 * counts)), dtype='<f4')
+    mask = np.ones(len(data), dtype=bool)
+    mask[count_pos] = False
+    data.view('<i4')[count_pos] = counts
+    if nContours:
+        data[mask] = np.concatenate(Curves).ravel()
+
+    xml = xmlstr.encode('latin-1')
+    hdr = np.zeros(1, dtype=DFC_HEADER_DTYPE)
+    hdr['magic'] = b'DFC_LE'
+    hdr['version'] = b'1.0'
+    hdr['hdrsize'] = DFC_HEADER_DTYPE.itemsize
+    hdr['mdoffset'] = DFC_HEADER_DTYPE.itemsize
+    hdr['dataStart'] = DFC_HEADER_DTYPE.itemsize + len(xml)
+    hdr['nContours'] = nContours
+
+    sys.stdout.write('Writing dfc file ' + filename + '...')
+    with open(filename, 'wb') as fid:
+        fid.write(hdr.tobytes() + xml)
+        fid.write(data.tobytes())
+    sys.stdout.write('Done.\n')
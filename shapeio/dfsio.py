@@ -7,69 +7,213 @@ __copyright__ = "Copyright 2013, Brandon Ayers, Ahmanson-Lovelace Brain Mapping
                  University of California Los Angeles"
 __email__ = "ayersb@ucla.edu"
 
+import os
+import sys
 import numpy as np
-import struct
 
 
-def readdfs(fname):
+# Layout of the 184 byte DFS header. Only the leading fields are named, the remainder
+# (orientation and padding) is not used by shapeio.
+DFS_HEADER_DTYPE = np.dtype([('ftype_header', 'S12'),
+                             ('hdrsize', '<i4'),
+                             ('mdoffset', '<i4'),
+                             ('pdoffset', '<i4'),
+                             ('nTriangles', '<i4'),
+                             ('nVertices', '<i4'),
+                             ('nStrips', '<i4'),
+                             ('stripSize', '<i4'),
+                             ('normals', '<i4'),
+                             ('uvStart', '<i4'),
+                             ('vcoffset', '<i4'),
+                             ('labelOffset', '<i4'),
+                             ('vertexAttributes', '<i4'),
+                             ])
+
+
+# Optional per-vertex blocks as (name, (header field holding the offset, dtype, components))
+DFS_VERTEX_BLOCKS = [('normals', ('normals', '<f4', 3)),
+                     ('vColor', ('vcoffset', '<f4', 3)),
+                     ('uv', ('uvStart', '<f4', 2)),
+                     ('labels', ('labelOffset', '<u2', 1)),  # labels are 2 byte unsigned integers
+                     ('attributes', ('vertexAttributes', '<f4', 1)),
+                     ]
+
+
+def readdfs_header(fid):
+    """Parse the DFS header from an open file object or a buffer.
+    Returns a hdr class with the same fields as readdfs, stored as int32 arrays of length 1.
+    """
     class hdr:
         pass
 
+    if hasattr(fid, 'read'):
+        fid.seek(0)
+        raw = np.frombuffer(fid.read(DFS_HEADER_DTYPE.itemsize), dtype=DFS_HEADER_DTYPE, count=1)
+    else:
+        raw = np.frombuffer(fid, dtype=DFS_HEADER_DTYPE, count=1)
+
+    hdr.ftype_header = np.frombuffer(raw['ftype_header'][0].ljust(12, b'\x00'), dtype='S1')
+    for field in DFS_HEADER_DTYPE.names[1:]:
+        setattr(hdr, field, raw[field].astype('int32'))
+    return hdr
+
+
+def dfs_sections(hdr):
+    """Return the location of every data block present in a DFS file.
+    Returns a list of (name, offset, dtype, shape) tuples, in file order for faces and vertices
+    followed by the optional blocks whose header offset is non-zero.
+    """
+    nTriangles = int(hdr.nTriangles[0])
+    nVertices = int(hdr.nVertices[0])
+    hdrsize = int(hdr.hdrsize[0])
+    sections = [('faces', hdrsize, '<i4', (nTriangles, 3)),
+                ('vertices', hdrsize + 12 * nTriangles, '<f4', (nVertices, 3)),
+                ]
+    for name, (field, dtype, ncomp) in DFS_VERTEX_BLOCKS:
+        offset = getattr(hdr, field)
+        if offset > 0:
+            shape = (nVertices, ncomp) if ncomp > 1 else (nVertices,)
+            sections.append((name, int(offset[0]), dtype, shape))
+    return sections
+
+
+def probedfs(fname):
+    """Return the number of vertices and faces and the blocks present in a dfs file,
+    by reading only its header."""
+    with open(fname, 'rb') as fid:
+        hdr = readdfs_header(fid)
+    fields = {}
+    for name, offset, dtype, shape in dfs_sections(hdr)[2:]:
+        fields[name] = np.dtype(dtype).name
+    return {'format': 'dfs',
+            'nVertices': int(hdr.nVertices[0]),
+            'nFaces': int(hdr.nTriangles[0]),
+            'fields': fields,
+            }
+
+
+def read_dfs_section(fid, offset, dtype, shape, buf=None):
+    """Read one block of a DFS file, or return a read-only view into buf if it is given."""
+    count = int(np.prod(shape))
+    if buf is not None:
+        data = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+    else:
+        fid.seek(offset)
+        data = np.fromfile(fid, dtype=dtype, count=count)
+    return data.reshape(shape)
+
+
+def readdfs(fname, mmap=False):
+    """Read a BrainSuite dfs surface.
+    Parameters
+    ----------
+    fname : dfs file
+    mmap  : if True, map the file into memory and return read-only views into it instead of
+            reading every block. Blocks are only paged in from disk when they are used.
+    Returns
+    -------
+    NFV   : class with faces, vertices and the optional normals, vColor, u, v, labels, attributes
+    """
     class NFV:
         pass
 
-    Curves = []
-
     fid = open(fname, 'rb')
-    hdr.ftype_header = np.array(struct.unpack('c' * 12, fid.read(12)), dtype='S1')
-    hdr.hdrsize = np.array(struct.unpack('i', fid.read(4)), dtype='int32')  # size(int32) = 4 bytes
-    hdr.mdoffset = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.pdoffset = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.nTriangles = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.nVertices = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.nStrips = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.stripSize = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.normals = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.uvStart = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.vcoffset = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.labelOffset = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    hdr.vertexAttributes = np.array(struct.unpack('i', fid.read(4)), dtype='int32')
-    fid.seek(hdr.hdrsize)
-    NFV.faces = np.array(struct.unpack(('i' * 3 * hdr.nTriangles), fid.read(3 * hdr.nTriangles * 4),
-                                     dtype='int32')).reshape(hdr.nTriangles, 3)
-    NFV.vertices = np.array(struct.unpack('f' * 3 * hdr.nVertices, fid.read(3 * hdr.nVertices * 4),
-                                        dtype='float32')).reshape(hdr.nVertices, 3)
-    if (hdr.normals > 0):
-        # print 'reading vertex normals.'
-        fid.seek(hdr.normals)
-        NFV.normals = np.array(struct.unpack('f' * 3 * hdr.nVertices, fid.read(3 * hdr.nVertices * 4),
-                                      dtype='float32')).reshape(hdr.nVertices, 3)
-    if (hdr.vcoffset > 0):
-        # print 'reading vertex colors.'
-        fid.seek(hdr.vcoffset)
-        NFV.vColor = np.array(struct.unpack('f' * 3 * hdr.nVertices, fid.read(3 * hdr.nVertices * 4),
-                                    dtype='float32')).reshape(hdr.nVertices, 3)
-    if (hdr.uvStart > 0):
-        # print 'reading uv coordinates.'
-        fid.seek(hdr.uvStart)
-        uv = np.array(struct.unpack('f' * 2 * hdr.nVertices, fid.read(2 * hdr.nVertices * 4), dtype='float32')).reshape(
-            hdr.nVertices, 2)
-        NFV.u = uv[:, 0]
-        NFV.v = uv[:, 1]
-    if (hdr.labelOffset > 0):
-        # print 'reading vertex labels.'
-        fid.seek(hdr.labelOffset)
-        # labels are 2 byte unsigned integers, so use unsigned short in python
-        NFV.labels = np.array(struct.unpack('H' * hdr.nVertices, fid.read(hdr.nVertices * 2), dtype='uint16'))
-    if (hdr.vertexAttributes > 0):
-        # print 'reading vertex attributes.'
-        fid.seek(hdr.vertexAttributes)
-        NFV.attributes = np.array(struct.unpack('f' * hdr.nVertices, fid.read(hdr.nVertices * 4), dtype='float32'))
+    hdr = readdfs_header(fid)
+    buf = None
+    if mmap:
+        buf = np.memmap(fid, dtype='uint8', mode='r')
+    for name, offset, dtype, shape in dfs_sections(hdr):
+        data = read_dfs_section(fid, offset, dtype, shape, buf)
+        if name == 'uv':
+            NFV.u = data[:, 0]
+            NFV.v = data[:, 1]
+        else:
+            setattr(NFV, name, data)
     NFV.name = fname
     fid.close()
     return (NFV)
 
 
+class LazyDFS(object):
+    """A dfs surface that only parses the header when it is created.
+    Each block (faces, vertices, normals, vColor, u, v, labels, attributes) is read from disk the
+    first time the attribute is accessed, and can be released again with drop(). Blocks that are
+    absent from the file raise AttributeError, same as the NFV class returned by readdfs.
+    """
+
+    def __init__(self, fname, mmap=False):
+        self.name = fname
+        self.mmap = mmap
+        with open(fname, 'rb') as fid:
+            self.hdr = readdfs_header(fid)
+        self._sections = dict((name, (offset, dtype, shape))
+                              for name, offset, dtype, shape in dfs_sections(self.hdr))
+        self._loaded = {}
+
+    @staticmethod
+    def _section_name(name):
+        if name in ('u', 'v'):
+            return 'uv'
+        return name
+
+    @staticmethod
+    def _field_names(sections):
+        names = []
+        for name in sections:
+            if name == 'uv':
+                names.extend(['u', 'v'])
+            else:
+                names.append(name)
+        return names
+
+    def available(self):
+        """Return the names of the blocks present in the file."""
+        return self._field_names(self._sections)
+
+    def loaded(self):
+        """Return the names of the blocks currently held in memory."""
+        return self._field_names(self._loaded)
+
+    def load(self, *names):
+        """Read the given blocks, or all the blocks present in the file if no names are given."""
+        sections = set(self._section_name(name) for name in names) if names else set(self._sections)
+        sections = [name for name in sections if name not in self._loaded]
+        if not sections:
+            return
+        with open(self.name, 'rb') as fid:
+            buf = np.memmap(fid, dtype='uint8', mode='r') if self.mmap else None
+            for name in sections:
+                if name not in self._sections:
+                    raise AttributeError("'{0}' is not present in dfs file {1}".format(name, self.name))
+                offset, dtype, shape = self._sections[name]
+                self._loaded[name] = read_dfs_section(fid, offset, dtype, shape, buf)
+
+    def drop(self, *names):
+        """Release the given blocks, or all loaded blocks if no names are given.
+        They are read again from disk on the next access."""
+        if not names:
+            self._loaded.clear()
+            return
+        for name in names:
+            self._loaded.pop(self._section_name(name), None)
+
+    def __getattr__(self, name):
+        # Only called when regular attribute lookup fails, i.e. for the data blocks
+        if name.startswith('_'):
+            raise AttributeError(name)
+        section = self._section_name(name)
+        if section not in self._sections:
+            raise AttributeError("'{0}' is not present in dfs file {1}".format(name, self.name))
+        if section not in self._loaded:
+            self.load(section)
+        data = self._loaded[section]
+        if name == 'u':
+            return data[:, 0]
+        if name == 'v':
+            return data[:, 1]
+        return data
+
+
 def writedfs(fname, NFV):
     ftype_header = np.array(['D', 'F', 'S', '_', 'L', 'E', ' ', 'v', '2', '.', '0', '\x00'], dtype='S1')
     hdrsize = 184
@@ -141,3 +285,37 @@ def writedfs(fname, NFV):
         # print 'writing attributes'
         fid.write(np.array(NFV.attributes, dtype='float32').tobytes())
     fid.close()
+
+
+def updatedfs(fname, name, data):
+    """Overwrite one per-vertex block of an existing dfs file in place.
+    Faces, vertices and the other blocks are left untouched on disk. If the block is not present
+    in the file yet, it is appended to the end of the file and its offset is set in the header.
+    Parameters
+    ----------
+    fname : dfs file
+    name  : one of 'attributes', 'labels', 'normals', 'vColor' or 'uv'
+    data  : per-vertex array, (nVertices, 3) for normals and vColor, (nVertices, 2) for uv
+    """
+    blocks = dict(DFS_VERTEX_BLOCKS)
+    if name not in blocks:
+        sys.stdout.write("Unknown dfs block " + name + ". Supported blocks are: " +
+                         ', '.join(blocks.keys()) + '\n')
+        return None
+    field, dtype, ncomp = blocks[name]
+    data = np.ascontiguousarray(data, dtype=dtype)
+
+    with open(fname, 'r+b') as fid:
+        hdr = readdfs_header(fid)
+        nVertices = int(hdr.nVertices[0])
+        if data.size != nVertices * ncomp:
+            sys.stdout.write("Mismatch in the length of " + name + " and the number of vertices of the mesh\n")
+            return None
+        offset = int(getattr(hdr, field)[0])
+        if offset <= 0:
+            fid.seek(0, os.SEEK_END)
+            offset = fid.tell()
+            fid.seek(DFS_HEADER_DTYPE.fields[field][1])
+            fid.write(np.array(offset, dtype='<i4').tobytes())
+        fid.seek(offset)
+        fid.write(data.tobytes())
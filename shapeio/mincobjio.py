@@ -0,0 +1,147 @@
+""" This module implements file reading and writing functions for the ascii MincObj format
+    (http://www.bic.mni.mcgill.ca) of polygon surfaces and lines, shared by surfio and curveio.
+"""
+
+__author__ = "Shantanu H. Joshi"
+__copyright__ = "Copyright 2013, Shantanu H. Joshi Ahmanson-Lovelace Brain Mapping Center, \
+                 University of California Los Angeles"
+__email__ = "s.joshi@ucla.edu"
+
+import sys
+import numpy as np
+import vtkio
+
+# Default surface properties (ambient, diffuse, specular, specular exponent, transparency)
+MINCOBJ_SURFPROP = (0.3, 0.3, 0.4, 10, 1)
+
+
+def read_mincobj(filename):
+    """Read a MincObj polygon ('P') or line ('L') object.
+    Everything after the object type is parsed as one stream of numbers with a single numpy call and
+    the sections are sliced out of it.
+    Parameters
+    ----------
+    filename : obj file
+    Returns
+    -------
+    OBJ      : class with type ('P' or 'L'), vertices float32 (N, 3), colour_flag, colors float32 (M, 4)
+               (one color, one per item or one per vertex for colour_flag 0, 1 or 2), end_indices and
+               indices int32. Polygon objects also have surfprop, normals float32 (N, 3) and faces int32
+               (F, 3), with polygons of more than three vertices split into triangles. Line objects
+               also have thickness and offsets, line i is vertices[indices[offsets[i]:offsets[i+1]]].
+    """
+    class OBJ:
+        pass
+
+    with open(filename, 'rb') as fid:
+        data = fid.read()
+    data = data.lstrip()
+    OBJ.type = data[0:1].decode('latin-1')
+    if OBJ.type not in ('P', 'L'):
+        raise ValueError('File ' + filename + ' is not an ascii MincObj polygon or line object')
+    values = np.fromstring(data[1:], dtype=float, sep=' ')
+
+    if OBJ.type == 'P':
+        OBJ.surfprop = values[0:5]
+        pos = 5
+    else:
+        OBJ.thickness = values[0]
+        pos = 1
+
+    def take(count):
+        start = pos
+        if start + count > len(values):
+            raise ValueError('File ' + filename + ' is truncated')
+        return values[start:start + count], start + count
+
+    num_pts = int(values[pos])
+    pos += 1
+    section, pos = take(3 * num_pts)
+    OBJ.vertices = section.reshape(num_pts, 3).astype('float32')
+    if OBJ.type == 'P':
+        section, pos = take(3 * num_pts)
+        OBJ.normals = section.reshape(num_pts, 3).astype('float32')
+
+    header, pos = take(2)
+    num_items = int(header[0])
+    OBJ.colour_flag = int(header[1])
+    num_colors = {0: 1, 1: num_items, 2: num_pts}.get(OBJ.colour_flag)
+    if num_colors is None:
+        raise ValueError('Unknown colour flag ' + str(OBJ.colour_flag) + ' in ' + filename)
+    section, pos = take(4 * num_colors)
+    OBJ.colors = section.reshape(num_colors, 4).astype('float32')
+
+    section, pos = take(num_items)
+    OBJ.end_indices = section.astype('int32')
+    section, pos = take(int(OBJ.end_indices[-1]) if num_items else 0)
+    OBJ.indices = section.astype('int32')
+
+    if OBJ.type == 'P':
+        OBJ.faces = vtkio.cells_to_triangles(OBJ.indices, OBJ.end_indices)
+    else:
+        OBJ.offsets = np.concatenate([[0], OBJ.end_indices]).astype('int64')
+    return OBJ
+
+
+def vertex_normals(coords, faces):
+    """Unit vertex normals, the sum of the (area weighted) normals of the faces around each vertex."""
+    coords = np.asarray(coords, dtype='float64')
+    faces = np.asarray(faces)
+    face_normals = np.cross(coords[faces[:, 1]] - coords[faces[:, 0]], coords[faces[:, 2]] - coords[faces[:, 0]])
+    normals = np.zeros_like(coords)
+    for k in range(3):
+        np.add.at(normals, faces[:, k], face_normals)
+    norms = np.linalg.norm(normals, axis=1)
+    norms[norms == 0] = 1
+    return normals / norms[:, None]
+
+
+def write_mincobj(filename, coords, faces, colors=None, normals=None, surfprop=MINCOBJ_SURFPROP):
+    """Write a triangulated surface as an ascii MincObj polygon object.
+    Parameters
+    ----------
+    filename : obj file
+    coords   : (N, 3) array
+    faces    : (F, 3) array
+    colors   : per-vertex RGB or RGBA colors (N, 3) or (N, 4), a single color, or None for white
+    normals  : (N, 3) vertex normals, computed from the faces if None
+    surfprop : surface properties written in the header
+    """
+    coords = np.asarray(coords)
+    faces = np.asarray(faces)
+    if faces.size and faces.min() == 1:
+        faces = faces - 1
+    if normals is None:
+        normals = vertex_normals(coords, faces)
+
+    if colors is None or len(colors) == 0:
+        colors = np.ones((1, 4))
+    colors = np.asarray(colors, dtype=float)
+    if colors.ndim == 1 and len(colors) not in (3, 4):
+        sys.stdout.write('MincObj files store colors only, per-vertex attributes are not saved.\n')
+        colors = np.ones((1, 4))
+    if colors.ndim == 1:
+        colors = colors.reshape(1, -1)
+    if colors.shape[1] == 3:
+        colors = np.column_stack([colors, np.ones(len(colors))])
+    if colors.shape[1] != 4 or len(colors) not in (1, len(coords)):
+        sys.stdout.write('Colors of shape ' + str(colors.shape) + ' are not one color or one color per vertex. '
+                         'Not saving file\n')
+        return None
+    colour_flag = 0 if len(colors) == 1 else 2
+
+    sys.stdout.write('Writing obj file ' + filename + '...')
+    with open(filename, 'wt') as fid:
+        fid.write('P {0:g} {1:g} {2:g} {3:g} {4:g} {5:d}\n'.format(*(tuple(surfprop) + (len(coords),))))
+        fid.write(vtkio.ascii_text(coords, '%f'))
+        fid.write('\n')
+        fid.write(vtkio.ascii_text(normals, '%f'))
+        fid.write('\n')
+        fid.write(' {0:d}\n'.format(len(faces)))
+        fid.write(' {0:d}\n'.format(colour_flag))
+        fid.write(vtkio.ascii_text(colors, '%f'))
+        fid.write('\n')
+        fid.write(vtkio.ascii_text(np.arange(1, len(faces) + 1) * 3, '%d', 8))
+        fid.write('\n')
+        fid.write(vtkio.ascii_text(faces, '%d'))
+    sys.stdout.write("Done.\n")
@@ -0,0 +1,159 @@
+""" This module implements fast header probes for the surface, curve and overlay formats read by shapeio.
+    A probe reads only the binary header or the leading XML/text tags of a file and returns the
+    number of vertices and faces and the per-vertex fields that are available.
+"""
+
+import os
+import sys
+import mmap
+from multiprocessing.pool import ThreadPool
+import dfsio
+import dfcio
+import FSdataio
+import ucfio
+import vtkio
+
+# Tags that hold the DataArrays of a piece
+VTP_SECTIONS = (b'PointData', b'CellData', b'Points', b'Verts', b'Lines', b'Strips', b'Polys')
+
+PLY_TYPES = {'char': 'int8', 'uchar': 'uint8', 'short': 'int16', 'ushort': 'uint16',
+             'int': 'int32', 'uint': 'uint32', 'float': 'float32', 'double': 'float64',
+             'int8': 'int8', 'uint8': 'uint8', 'int16': 'int16', 'uint16': 'uint16',
+             'int32': 'int32', 'uint32': 'uint32', 'float32': 'float32', 'float64': 'float64',
+             }
+
+
+def _map_file(filename):
+    with open(filename, 'rb') as fid:
+        return mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def probe_vtp(filename):
+    """Probe a VTK XML PolyData file by scanning its tags up to the appended data section."""
+    mm = _map_file(filename)
+    end = mm.find(b'<AppendedData')
+    if end == -1:
+        end = len(mm)
+
+    nVertices = nFaces = nLines = 0
+    fields = {}
+    section = None
+    for match in vtkio.VTP_TAG_REGEX.finditer(mm, 0, end):
+        closing, tag, attrs, selfclosing = match.groups()
+        if tag == b'Piece' and not closing:
+            attrs = dict(vtkio.XML_ATTRIBUTE_REGEX.findall(attrs))
+            nVertices += int(attrs.get(b'NumberOfPoints', 0))
+            nFaces += int(attrs.get(b'NumberOfPolys', 0))
+            nLines += int(attrs.get(b'NumberOfLines', 0))
+        elif tag == b'DataArray':
+            if not closing and section in (b'PointData', b'CellData'):
+                attrs = dict(vtkio.XML_ATTRIBUTE_REGEX.findall(attrs))
+                name = attrs.get(b'Name', b'').decode()
+                if section == b'CellData':
+                    name = 'cell:' + name
+                fields[name] = vtkio.VTK_XML_DTYPES.get(attrs.get(b'type', b'').decode(), 'unknown')
+        elif tag in VTP_SECTIONS:
+            section = None if closing or selfclosing else tag
+    mm.close()
+    return {'format': 'vtp',
+            'nVertices': nVertices,
+            'nFaces': nFaces,
+            'nLines': nLines,
+            'fields': fields,
+            }
+
+
+def probe_ply(filename):
+    """Probe a PLY file by reading its text header."""
+    nVertices = nFaces = 0
+    fields = {}
+    element = None
+    with open(filename, 'rb') as fid:
+        if fid.readline().strip() != b'ply':
+            raise ValueError('File ' + filename + ' is not a PLY file')
+        for line in fid:
+            tokens = line.decode('latin-1').split()
+            if not tokens or tokens[0] in ('comment', 'obj_info'):
+                continue
+            if tokens[0] == 'end_header':
+                break
+            if tokens[0] == 'element':
+                element = tokens[1]
+                if element == 'vertex':
+                    nVertices = int(tokens[2])
+                elif element == 'face':
+                    nFaces = int(tokens[2])
+            elif tokens[0] == 'property' and element == 'vertex' and tokens[1] != 'list':
+                if tokens[2] not in ('x', 'y', 'z'):
+                    fields[tokens[2]] = PLY_TYPES.get(tokens[1], 'unknown')
+    return {'format': 'ply',
+            'nVertices': nVertices,
+            'nFaces': nFaces,
+            'fields': fields,
+            }
+
+
+PROBES = {'.dfs': dfsio.probedfs,
+          '.dfc': dfcio.probedfc,
+          '.mgh': FSdataio.probe_mgh,
+          '.mgz': FSdataio.probe_mgh,
+          '.vtp': probe_vtp,
+          '.ucf': ucfio.probe_ucf,
+          '.ply': probe_ply,
+          '.pial': FSdataio.probe_geometry,
+          '.white': FSdataio.probe_geometry,
+          '.inflated': FSdataio.probe_geometry,
+          '.orig': FSdataio.probe_geometry,
+          '.smoothwm': FSdataio.probe_geometry,
+          '.sphere': FSdataio.probe_geometry,
+          '.reg': FSdataio.probe_geometry,
+          }
+
+
+def probe(filename):
+    """Return the header information of a surface, curve or overlay file.
+    Parameters
+    ----------
+    filename : file in one of the formats in PROBES
+    Returns
+    -------
+    info     : dict with the format, nVertices, nFaces and fields, a dict from the names of
+               the per-vertex arrays present in the file to their dtype. Some formats add
+               nContours, nLevels, nLines or nFrames.
+    """
+    path_filename, ext = os.path.splitext(filename)
+    if ext not in PROBES:
+        sys.stdout.write("Input format " + ext + " not supported for probing.\n")
+        return None
+    return PROBES[ext](filename)
+
+
+def _probe_or_error(filename):
+    try:
+        return filename, probe(filename)
+    except Exception as e:
+        return filename, {'error': str(e)}
+
+
+def probe_files(filelist, workers=8):
+    """Probe a list of files in parallel. Files that cannot be probed are reported with an error key.
+    Returns a dict from filename to the probe information."""
+    pool = ThreadPool(workers)
+    try:
+        results = pool.map(_probe_or_error, filelist)
+    finally:
+        pool.close()
+    return dict(results)
+
+
+def probe_directory(dirname, recursive=False, workers=8):
+    """Probe all the supported files in a directory in parallel.
+    Returns a dict from filename to the probe information."""
+    filelist = []
+    for root, dirs, files in os.walk(dirname):
+        for f in sorted(files):
+            if os.path.splitext(f)[1] in PROBES:
+                filelist.append(os.path.join(root, f))
+        if not recursive:
+            break
+    return probe_files(filelist, workers)
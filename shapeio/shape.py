@@ -17,6 +17,14 @@ class Shape(object):
                 '.vtp': 'surface',
                 '.vtk': 'surface',
                 '.mgh': 'FSdata',
+                '.mgz': 'FSdata',
+                '.thickness': 'FSdata',
+                '.curv': 'FSdata',
+                '.sulc': 'FSdata',
+                '.area': 'FSdata',
+                '.volume': 'FSdata',
+                '.jacobian_white': 'FSdata',
+                '.annot': 'FSdata',
                 }
 
     @staticmethod
@@ -34,7 +42,7 @@ class Shape(object):
             return shapobj
         elif Shape.datatype[ext] == 'FSdata':
             shapeobj = surfio.Surface(coords=0, faces=0, ismultilevelUCF=False)
-            shapeobj.attributes = FSdataio.load_mgh(filename)
+            shapeobj.attributes = FSdataio.readdata(filename)
             return shapeobj
         else:
             sys.stdout.write('Error: Unsupported data type. Supported data types are: ' + ', '.join(Shape.datatype.keys()))
@@ -10,10 +10,11 @@ __email__ = "s.joshi@ucla.edu"
 import os
 import sys
 import numpy as np
-import vtk
-from vtk.util import numpy_support
 import vtkio
+import ucfio
+import mincobjio
 import dfsio
+import FSdataio
 import re
 import StringIO
 import pandas as pd
@@ -113,126 +114,24 @@ def writeccbbm(coords, faces, attributes, filename):
     sys.stdout.write('Done.')
 
 
-def WriteUCF(coords,attriblabel,attributes,filename):
-    T = coords.shape[0]
-    attributes = np.array(attributes)
-    attrib_flag = False
-    if len(attributes):
-        L = attributes.shape[0]
-        if L == T:
-            attrib_flag = True
-        else:
-            sys.stdout.write("Mismatch in the length of attributes and the length of vertices of the mesh\n")
-            return None
-    else:
-        L = 0
-
-    sys.stdout.write('Writing ucf file ' + filename + '...')
-    f = open(filename,'wt')
-    f.write('#UCF created by surfio\n')
-    f.write('<width=>\n')
-    f.write('64\n')
-    f.write('<height=>\n')
-    f.write('146\n')
-    f.write('<xrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<yrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<zrange=>\n')
-    f.write("{0:f} {1:f}\n".format(0,0))
-    f.write('<levels>\n');
-    f.write('1\n');
-    f.write('<level number=>\n');
-    f.write('0.0000\n');
-    f.write('<point_num=>\n');
-    f.write("{0:d}\n".format(T));
-    f.write('<contour_data=>\n');
-
-    if attrib_flag:
-        for i in np.arange(0,T):
-            f.write("{0:f} {1:f} {2:f} {3:f}\n".format(float(coords[i,0]),float(coords[i,1]),float(coords[i,2]),float(attributes[i])))
-    else:
-        for i in np.arange(0,T):
-            f.write("{0:f} {1:f} {2:f}\n".format(float(coords[i,0]),float(coords[i,1]),float(coords[i,2])))
-
-    f.write('<end of level>\n')
-    f.write('<end>\n');
-    f.close()
-    sys.stdout.write("Done.\n")
+def WriteUCF(coords,attriblabel,attributes,filename,precision=6):
+    attributes_list = [attributes] if len(attributes) else []
+    ucfio.write_ucf(filename,[np.asarray(coords)],attributes_list,precision)
 
 
 def ReadMincObj(filename):
-    fid = open(filename,'rt')
-
+    obj = mincobjio.read_mincobj(filename)
 
-    shape_type = fid.readline().split()
-
-    if shape_type[0] == 'P':
-        num_pts = int(shape_type[-1])
-
-        # Read vertices
-        coords = []
-        for i in range(0,num_pts):
-            line_split = fid.readline().split()
-            Xtemp = [float(line_split[0]),float(line_split[1]),float(line_split[2])]
-            coords.append(Xtemp)
-
-        # Read a blank line
-        fid.readline()
-
-        # Read normals
-        normals = []
-        for i in range(0,num_pts):
-            line_split = fid.readline().split()
-            Xtemp = [float(line_split[0]),float(line_split[1]),float(line_split[2])]
-            normals.append(Xtemp)
-
-        # Read a blank line
-        fid.readline()
-        # Read number of triangles
-        line = fid.readline()
-        num_triangles = int(line.split()[0])
-        line = fid.readline()
-        color_type = int(line.split()[0])
-
-        if color_type == 2:
-        # Read colors
-            pt_colors = []
-            for i in range(0,num_pts):
-                line_split = fid.readline().split()
-                Xtemp = [float(line_split[0]),float(line_split[1]),float(line_split[2]),float(line_split[3])]
-                pt_colors.append(Xtemp)
-        elif color_type == 0:
-            line = fid.readline()
-            line_split = line.split()
-            pt_colors = [float(line_split[0]),float(line_split[1]),float(line_split[2]),float(line_split[3])]
-
-        # Read a blank line
-        dummy = fid.readline()
-
-        # Till the next blank line, read all lines
-        dummy = fid.readline()
-        while dummy != '':
-            dummy = fid.readline().rstrip('\n')
-
-        faces = []
-        for i in range(0,num_triangles):
-            line_split = fid.readline().split()
-            Xtemp = [int(line_split[0]),int(line_split[1]),int(line_split[2])]
-            faces.append(Xtemp)
-
-        fid.close()
-        isMultilevelUCF = False
-        coords = np.array(coords)
-        attributes = pt_colors
-        return coords, faces, attributes, isMultilevelUCF
-
-
-    elif shape_type[0] == 'L': # This means the obj file contains lines
+    if obj.type == 'L': # This means the obj file contains lines
         sys.stdout.write('This surface file ' + filename + ' contains obj curves. Exiting without reading...\n')
         coords =  faces = attributes = isMultilevelUCF = False
         return coords, faces, attributes, isMultilevelUCF
 
+    # Per-polygon (colour_flag 1) or per-vertex (colour_flag 2) colors, or the single color of the object
+    attributes = obj.colors[0] if obj.colour_flag == 0 else obj.colors
+    isMultilevelUCF = False
+    return obj.vertices, obj.faces, attributes, isMultilevelUCF
+
 def ReadCCBBM_sphere(filename):
     fid = open(filename,'rt')
     lines = fid.readlines()
@@ -379,35 +278,7 @@ def ReadUCFMultipleLevelsWithData(filename):
     X         : array of surfaces/curves
     atributes : float array of data values
     """
-    #sys.stdout.write('Reading UCF file ' + filename+'...')
-    fid = open(filename,'rt')
-    dummy = ''
-    # Read all the preamble till you reach contour_data
-    while dummy != '<levels>':
-        dummy = fid.readline().rstrip('\n')
-        dummy = dummy.rstrip()
-    # The next line is the number of levels
-    num_levels = int(fid.readline().rstrip('\n'))
-
-    X = []
-    attributes = []
-    for ctr in np.arange(0,num_levels):
-        while dummy != '<point_num=>':
-            dummy = fid.readline().rstrip('\n');
-            dummy=dummy.rstrip()
-        N = int(fid.readline().rstrip('\n'))
-        dummy = fid.readline()
-        Xtemp = [fid.readline().rstrip().split(' ') for i in np.arange(0,N)]
-
-        Xtemp = np.array(Xtemp,dtype=float)
-
-        X.append(np.array(Xtemp[:,0:3]))
-        if Xtemp.shape[1] == 4:
-            attributes.append(np.array(Xtemp[:,3]))
-
-    sys.stdout.write('Done.\n')
-    fid.close()
-    return X,attributes
+    return ucfio.read_ucf_levels(filename)
 
 
 def Read(filename):
@@ -456,17 +327,15 @@ def readsurface_new(filename):
         return coords,faces,attributes,isMultilevelUCF
 
     def ply(filename):
+        # Import vtk only when it is needed, it is slow to load
+        import vtk
+        from vtk.util import numpy_support
         plyreader = vtk.vtkPLYReader()
         plyreader.SetFileName(filename)
         plyreader.Update()
         mesh = plyreader.GetOutput()
         coords = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
-        temp_faces = numpy_support.vtk_to_numpy(mesh.GetPolys().GetData())
-
-        num_faces = mesh.GetPolys().GetNumberOfCells()
-        strides = np.arange(0, len(temp_faces), 4)
-        faces = np.delete(temp_faces, strides)
-        faces = np.reshape(faces, (num_faces, 3))
+        faces = vtkio.vtk_cells_to_triangles(mesh.GetPolys())
 
         isMultilevelUCF = False
         attributes = []
@@ -587,8 +456,7 @@ def writesurface(filename,coords,faces,attributes):
         WriteUCF(coords,'',attributes,filename)
 
     def vtkformat(filename):
-        sys.stdout.write("Not implemented.")
-        return None
+        vtkio.WriteVTK_Polydata(filename,coords,faces,'',attributes)
 
     def pial(filename):
         nibabel.freesurfer.io.write_geometry(filename, coords, faces)
@@ -609,14 +477,16 @@ def writesurface(filename,coords,faces,attributes):
         sys.stdout.write("Output format " + ext + " not supported. Exiting without saving.\n")
         return None
 
-def writesurface_new(filename,coords,faces,attributes=[],isMultilevelUCF=False):
+def writesurface_new(filename,coords,faces,attributes=[],isMultilevelUCF=False,encoding=None,compress=False):
+    """Write a surface. For vtp, encoding is one of 'ascii' (the default), 'binary' or 'appended'
+    and compress enables zlib compression of the binary encodings. Legacy vtk files are written
+    in binary big-endian unless encoding is 'ascii'."""
 
     def mincobj(filename):
-        pass
-        # write_mincobj(coords, faces, attributes, filename)
+        mincobjio.write_mincobj(filename, coords, faces, attributes)
 
     def vtp(filename):
-        vtkio.WriteVTK_XML_Polydata_old(filename,coords,faces,'',attributes)
+        vtkio.WriteVTK_XML_Polydata(filename,coords,faces,'',attributes,encoding or 'ascii',compress)
 
     def ccbbm(filename):
         writeccbbm(coords, faces, attributes, filename)
@@ -634,14 +504,22 @@ def writesurface_new(filename,coords,faces,attributes=[],isMultilevelUCF=False):
         WriteUCF(coords, '', attributes, filename)
 
     def vtkformat(filename):
-        sys.stdout.write("Not implemented.")
-        return None
+        vtkio.WriteVTK_Polydata(filename,coords,faces,'',attributes,encoding != 'ascii')
 
     def pial(filename):
         sys.stdout.write('Writing pial file ' + filename)
         nibabel.freesurfer.io.write_geometry(filename, coords, faces)
         return None
 
+    def mgh(filename):
+        sys.stdout.write('Writing mgh file ' + filename + '...')
+        if isMultilevelUCF:
+            FSdataio.save_mgh(filename, aggregate_ucf_attributes(attributes))
+        else:
+            FSdataio.save_mgh(filename, attributes)
+        sys.stdout.write('Done.\n')
+        return None
+
     path_filename,ext = os.path.splitext(filename)
 
     options = {'.vtp'  : vtp,
@@ -650,6 +528,9 @@ def writesurface_new(filename,coords,faces,attributes=[],isMultilevelUCF=False):
                '.pial' : pial,
                '.dfs' : dfs,
                '.m': ccbbm,
+               '.mgh': mgh,
+               '.mgz': mgh,
+               '.obj': mincobj,
     }
     if ext in options:
 #        sys.stdout.write("Writing surface " + filename + "...")
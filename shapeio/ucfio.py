@@ -0,0 +1,241 @@
+""" This module implements file reading and writing functions for the ucf (BrainSuite contour) format
+    shared by curveio and surfio. All levels of a file are read into one coordinate buffer with level
+    offsets, and each level is written as one block of text.
+"""
+
+__author__ = "Shantanu H. Joshi"
+__copyright__ = "Copyright 2013, Shantanu H. Joshi Ahmanson-Lovelace Brain Mapping Center, \
+                 University of California Los Angeles"
+__email__ = "s.joshi@ucla.edu"
+
+import re
+import sys
+import mmap
+import numpy as np
+import vtkio
+import curveset
+
+UCF_LEVELS_REGEX = re.compile(br'<levels>\s*(\d+)')
+UCF_LEVEL_REGEX = re.compile(br'<point_num=>\s*(\d+)\s*<contour_data=>[^\n]*\n')
+UCF_POINT_NUM_REGEX = re.compile(br'<point_num=>\s*(\d+)\s*<contour_data=>[^\n]*\n([^\n]*)')
+
+UCF_HEADER = ('#UCF created by surfio\n'
+              '<width=>\n64\n'
+              '<height=>\n146\n'
+              '<xrange=>\n0.000000 0.000000\n'
+              '<yrange=>\n0.000000 0.000000\n'
+              '<zrange=>\n0.000000 0.000000\n'
+              '<levels>\n')
+
+
+def _parse_level(data, start, N):
+    """Parse the N rows of one level starting at byte offset start with a single text parsing call."""
+    end = data.find(b'<', start)
+    if end == -1:
+        end = len(data)
+    if N == 0:
+        return np.empty((0, 3))
+    values = vtkio.parse_ascii_values(data[start:end], float)
+    if values.size % N != 0 or values.size // N not in (3, 4):
+        raise ValueError('Level with ' + str(N) + ' points has ' + str(values.size) + ' values')
+    return values.reshape(N, values.size // N)
+
+
+def read_ucf_buffer(filename):
+    """Read all levels of a UCF file into a single buffer.
+    Parameters
+    ----------
+    filename   : UCF file
+    Returns
+    -------
+    coords     : float array (N, 3) of the points of all levels
+    attributes : float array (N,) of data values, None if the levels have no data column
+    offsets    : int64 array (nLevels+1,), level i is coords[offsets[i]:offsets[i+1]]
+    """
+    with open(filename, 'rb') as fid:
+        data = fid.read()
+
+    levels = [_parse_level(data, match.end(), int(match.group(1))) for match in UCF_LEVEL_REGEX.finditer(data)]
+    offsets = np.zeros(len(levels) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(level) for level in levels])
+
+    coords = np.empty((offsets[-1], 3))
+    # Empty levels have no columns to tell whether the file has data values
+    columns = [level.shape[1] for level in levels if len(level)]
+    attributes = np.empty(offsets[-1]) if columns and all(ncols == 4 for ncols in columns) else None
+    for ii, level in enumerate(levels):
+        coords[offsets[ii]:offsets[ii + 1]] = level[:, 0:3]
+        if attributes is not None and len(level):
+            attributes[offsets[ii]:offsets[ii + 1]] = level[:, 3]
+    return coords, attributes, offsets
+
+
+def read_ucf_levels(filename):
+    """Read UCF file.
+    Parameters
+    ----------
+    filename  : UCF file
+    Returns
+    -------
+    X         : list of (N, 3) arrays, one per level
+    atributes : list of float arrays of data values, empty if the levels have no data column
+    """
+    coords, attributes, offsets = read_ucf_buffer(filename)
+    X = np.split(coords, offsets[1:-1])
+    if attributes is None:
+        return X, []
+    return X, np.split(attributes, offsets[1:-1])
+
+
+def probe_ucf(filename):
+    """Probe a UCF file by scanning its level tags without parsing the coordinates."""
+    with open(filename, 'rb') as fid:
+        mm = mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+    levels = UCF_LEVELS_REGEX.search(mm)
+    nLevels = int(levels.group(1)) if levels else 0
+    nVertices = 0
+    fields = {}
+    for match in UCF_POINT_NUM_REGEX.finditer(mm):
+        nVertices += int(match.group(1))
+        if len(match.group(2).split()) > 3:
+            fields['attributes'] = 'float64'
+    mm.close()
+    return {'format': 'ucf',
+            'nVertices': nVertices,
+            'nFaces': 0,
+            'nLevels': nLevels,
+            'fields': fields,
+            }
+
+
+def format_ucf_level(level_number, coords, attributes=None, precision=6):
+    """Format one level, tags and contour data, as text with a single string formatting call.
+    Parameters
+    ----------
+    level_number : number written after the <level number=> tag
+    coords       : (N, 3) array
+    attributes   : (N,) array of data values written as a fourth column, or None
+    precision    : number of decimals of the coordinates and data values
+    Returns
+    -------
+    text         : str
+    """
+    coords = np.asarray(coords, dtype=float)
+    if attributes is not None and len(attributes):
+        data = np.column_stack([coords, np.asarray(attributes, dtype=float)])
+    else:
+        data = coords
+    return ('<level number=>\n{0:f}\n<point_num=>\n{1:d}\n<contour_data=>\n'.format(level_number, data.shape[0]) +
+            vtkio.ascii_text(data, '%.{0:d}f'.format(precision)) +
+            '<end of level>\n')
+
+
+def write_ucf(filename, coords_list, attributes_list=[], precision=6):
+    """Write UCF file.
+    Parameters
+    ----------
+    filename        : UCF file
+    coords_list     : list of (N, 3) arrays, one per level, or a CurveSet
+    attributes_list : list of float arrays of data values, one per level, or empty to use the
+                      attributes of a CurveSet
+    precision       : number of decimals of the coordinates and data values
+    """
+    if isinstance(coords_list, curveset.CurveSet):
+        coords_list, curveset_attributes = coords_list.to_list()
+        if not len(attributes_list):
+            attributes_list = curveset_attributes
+    if len(attributes_list):
+        if len(attributes_list) != len(coords_list) or \
+                any(len(a) != len(c) for a, c in zip(attributes_list, coords_list)):
+            sys.stdout.write("Mismatch in the length of attributes and the length of vertices of the mesh\n")
+            return None
+    else:
+        attributes_list = [None] * len(coords_list)
+
+    def level_block(ii):
+        return format_ucf_level(ii, coords_list[ii], attributes_list[ii], precision).encode('ascii')
+
+    sys.stdout.write('Writing ucf file ' + filename + '...')
+    blocks = [level_block(ii) for ii in range(len(coords_list))]
+
+    with open(filename, 'wb') as fid:
+        fid.write((UCF_HEADER + '{0:d}\n'.format(len(coords_list))).encode('ascii'))
+        fid.writelines(blocks)
+        fid.write(b'<end>\n')
+    sys.stdout.write("Done.\n")
+
+
+def iter_ucf_levels(fid):
+    """Iterate over the levels of a UCF file one level at a time.
+    Parameters
+    ----------
+    fid        : UCF file name or a file opened for reading, in binary or text mode
+    Yields
+    ------
+    level_index, coords, attributes : index of the level, (N, 3) float array and (N,) float array of
+                                      data values, None if the level has no data column
+    """
+    if not hasattr(fid, 'readline'):
+        with open(fid, 'rb') as f:
+            for level in iter_ucf_levels(f):
+                yield level
+        return
+
+    level_index = 0
+    for line in iter(fid.readline, fid.read(0)):
+        tag = line.strip()
+        if tag not in (b'<point_num=>', '<point_num=>'):
+            continue
+        N = int(fid.readline())
+        fid.readline()
+        block = fid.read(0).join([fid.readline() for i in range(N)])
+        if N == 0:
+            values = np.empty((0, 3))
+        else:
+            values = vtkio.parse_ascii_values(block, float)
+            if values.size != 3 * N and values.size != 4 * N:
+                raise ValueError('Level with ' + str(N) + ' points has ' + str(values.size) + ' values')
+            values = values.reshape(N, -1)
+        attributes = values[:, 3].copy() if values.shape[1] == 4 else None
+        yield level_index, np.ascontiguousarray(values[:, 0:3]), attributes
+        level_index += 1
+
+
+class UCFWriter(object):
+    """Write a UCF file one level at a time. The number of levels is written as a fixed width
+    placeholder in the header and filled in when the writer is closed.
+    Use as a context manager or call close() after the last level.
+    """
+    LEVELS_WIDTH = 10
+
+    def __init__(self, filename, precision=6):
+        self.filename = filename
+        self.precision = precision
+        self.nLevels = 0
+        self.fid = open(filename, 'wb')
+        self.fid.write(UCF_HEADER.encode('ascii'))
+        self._levels_offset = self.fid.tell()
+        self.fid.write((' ' * self.LEVELS_WIDTH + '\n').encode('ascii'))
+
+    def write_level(self, coords, attributes=None, level_number=None):
+        """Append a level of (N, 3) coords and optional (N,) data values."""
+        if attributes is not None and len(attributes) and len(attributes) != len(coords):
+            raise ValueError("Mismatch in the length of attributes and the length of vertices of level " + str(self.nLevels))
+        if level_number is None:
+            level_number = self.nLevels
+        self.fid.write(format_ucf_level(level_number, coords, attributes, self.precision).encode('ascii'))
+        self.nLevels += 1
+
+    def close(self):
+        if self.fid.closed:
+            return
+        self.fid.write(b'<end>\n')
+        self.fid.seek(self._levels_offset)
+        self.fid.write('{0:<{1}d}'.format(self.nLevels, self.LEVELS_WIDTH).encode('ascii'))
+        self.fid.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
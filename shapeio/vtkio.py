@@ -1,9 +1,35 @@
+import re
 import sys
+import zlib
+import base64
+import functools
 import numpy as np
-import vtk
-from vtk.util import numpy_support
+from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# vtk is imported inside the functions that use it. Importing it is slow, and the vtp/vtk readers
+# and writers below only need numpy.
+
+# numpy dtype names and the matching VTK XML DataArray types
+VTK_XML_TYPES = {'int8': 'Int8',
+                 'uint8': 'UInt8',
+                 'int16': 'Int16',
+                 'uint16': 'UInt16',
+                 'int32': 'Int32',
+                 'uint32': 'UInt32',
+                 'int64': 'Int64',
+                 'uint64': 'UInt64',
+                 'float32': 'Float32',
+                 'float64': 'Float64',
+                 }
+
+def ReadVTK_Polydata_vtk(vtkfile):
+    import vtk
+    from vtk.util import numpy_support
 
-def ReadVTK_Polydata(vtkfile):
     reader = vtk.vtkPolyDataReader()
     reader.SetFileName(vtkfile)
     reader.Update()
@@ -18,18 +44,15 @@ def ReadVTK_Polydata(vtkfile):
         if pointdata.GetArray(0).GetName() != 'normals':
             attributes = numpy_support.vtk_to_numpy(pointdata.GetArray(0))
 
-    temp_faces = numpy_support.vtk_to_numpy(mesh.GetPolys().GetData())
-
-    num_faces = mesh.GetPolys().GetNumberOfCells()
-    strides = np.arange(0, len(temp_faces), 4)
-    faces = np.delete(temp_faces, strides)
-    faces = np.reshape(faces, (num_faces, 3))
+    faces = vtk_cells_to_triangles(mesh.GetPolys())
 
     return coords, faces, attributes
 
-def ReadVTK_XML_Polydata(vtkfile):
+def ReadVTK_XML_Polydata_vtk(vtkfile):
+    import vtk
+    from vtk.util import numpy_support
 
-    sys.stdout.write("Reading VTK XML Polydata (Assuming triangular mesh)...")
+    sys.stdout.write("Reading VTK XML Polydata...")
     reader = vtk.vtkXMLPolyDataReader()
     reader.SetFileName(vtkfile)
     reader.Update()
@@ -48,76 +71,690 @@ def ReadVTK_XML_Polydata(vtkfile):
         if pointdata.HasArray('VertexLabel'):
             labels = numpy_support.vtk_to_numpy(pointdata.GetArray('VertexLabel'))
 
-    temp_faces = numpy_support.vtk_to_numpy(mesh.GetPolys().GetData())
-
-    num_faces = mesh.GetPolys().GetNumberOfCells()
-    strides = np.arange(0, len(temp_faces), 4)
-    faces = np.delete(temp_faces, strides)
-    faces = np.reshape(faces, (num_faces, 3))
+    faces = vtk_cells_to_triangles(mesh.GetPolys())
 
     return coords, faces, attributes, labels
 
-def write_vtk_xml_polydata_curve(filename, coords, attributes=[]):
-    if coords.shape[0] < coords.shape[1]:
-        coords = coords.T
+# Exceptions raised by the numpy readers for files they cannot decode. The readers then fall back to VTK.
+NATIVE_READER_ERRORS = (NotImplementedError, ValueError, KeyError, IndexError, zlib.error)
+
+VTK_XML_DTYPES = dict((vtk_type, dtype) for dtype, vtk_type in VTK_XML_TYPES.items())
+
+VTK_LEGACY_DTYPES = {'unsigned_char': 'u1',
+                     'char': 'i1',
+                     'unsigned_short': 'u2',
+                     'short': 'i2',
+                     'unsigned_int': 'u4',
+                     'int': 'i4',
+                     'unsigned_long': 'u8',
+                     'long': 'i8',
+                     'vtkIdType': 'i4',
+                     'vtktypeint8': 'i1',
+                     'vtktypeuint8': 'u1',
+                     'vtktypeint16': 'i2',
+                     'vtktypeuint16': 'u2',
+                     'vtktypeint32': 'i4',
+                     'vtktypeuint32': 'u4',
+                     'vtktypeint64': 'i8',
+                     'vtktypeuint64': 'u8',
+                     'float': 'f4',
+                     'double': 'f8',
+                     }
+
+# numpy dtype names and the matching legacy VTK types used by the writer
+VTK_LEGACY_TYPES = {'uint8': 'unsigned_char',
+                    'int8': 'char',
+                    'uint16': 'unsigned_short',
+                    'int16': 'short',
+                    'uint32': 'unsigned_int',
+                    'int32': 'int',
+                    'float32': 'float',
+                    'float64': 'double',
+                    }
+
+VTP_TAG_REGEX = re.compile(br'<(/?)([A-Za-z]\w*)([^>]*?)(/?)>')
+XML_ATTRIBUTE_REGEX = re.compile(br'(\w+)\s*=\s*"([^"]*)"')
+LEGACY_KEYWORD_REGEX = re.compile(br'^[ \t]*[A-Za-z_]', re.M)
+VTP_CELL_SECTIONS = {b'Verts': 'verts', b'Lines': 'lines', b'Strips': 'strips', b'Polys': 'polys'}
+
+
+class LazyArrays(Mapping):
+    """Read-only mapping from array name to numpy array, in file order.
+    Every array is decoded the first time it is accessed and then kept.
+    """
+
+    def __init__(self, arrays=None):
+        self._decoders = OrderedDict()
+        self._arrays = {}
+        if arrays is not None:
+            for name, array in arrays.items():
+                self.add(name, array)
+
+    def add(self, name, decoder):
+        """Add an array, or a function without arguments that returns it."""
+        self._decoders[name] = decoder
+        self._arrays.pop(name, None)
+
+    def is_loaded(self, name):
+        return name in self._arrays or not callable(self._decoders[name])
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            decoder = self._decoders[name]
+            self._arrays[name] = decoder() if callable(decoder) else decoder
+        return self._arrays[name]
+
+    def __iter__(self):
+        return iter(self._decoders)
+
+    def __len__(self):
+        return len(self._decoders)
+
+    def __repr__(self):
+        return 'LazyArrays([' + ', '.join(repr(name) for name in self._decoders) + '])'
+
+
+def _decode_base64_array(text, header_dtype, compressed):
+    """Decode a base64 DataArray, either inline or appended, to its raw bytes."""
+    text = b''.join(text.split())
+    hsize = np.dtype(header_dtype).itemsize
+    if not compressed:
+        # The header is encoded either together with the data or as its own base64 block
+        hchars = 4 * ((hsize + 2) // 3)
+        if text[hchars - 1:hchars] == b'=':
+            nbytes = int(np.frombuffer(base64.b64decode(text[:hchars]), dtype=header_dtype)[0])
+            return base64.b64decode(text[hchars:])[:nbytes]
+        data = base64.b64decode(text)
+        nbytes = int(np.frombuffer(data, dtype=header_dtype, count=1)[0])
+        return data[hsize:hsize + nbytes]
+
+    nblocks = int(np.frombuffer(base64.b64decode(text[:4 * hsize]), dtype=header_dtype, count=1)[0])
+    hchars = 4 * (((3 + nblocks) * hsize + 2) // 3)
+    header = np.frombuffer(base64.b64decode(text[:hchars]), dtype=header_dtype, count=3 + nblocks)
+    return _decompress_blocks(header, base64.b64decode(text[hchars:]), 0)
+
+
+def _decompress_blocks(header, data, pos):
+    """Inflate the zlib blocks described by a VTK compression header, starting at data[pos]."""
+    blocks = []
+    for size in header[3:]:
+        blocks.append(zlib.decompress(data[pos:pos + int(size)]))
+        pos += int(size)
+    return b''.join(blocks)
+
+
+def _decode_appended_raw(raw, offset, header_dtype, compressed):
+    """Return the bytes of an appended raw DataArray, as a zero-copy view when it is not compressed."""
+    hsize = np.dtype(header_dtype).itemsize
+    if not compressed:
+        nbytes = int(np.frombuffer(raw, dtype=header_dtype, count=1, offset=offset)[0])
+        return raw[offset + hsize:offset + hsize + nbytes]
+    nblocks = int(np.frombuffer(raw, dtype=header_dtype, count=1, offset=offset)[0])
+    header = np.frombuffer(raw, dtype=header_dtype, count=3 + nblocks, offset=offset)
+    return _decompress_blocks(header, raw, offset + (3 + nblocks) * hsize)
+
+
+def parse_ascii_values(text, dtype):
+    """Parse whitespace separated numbers with a single numpy call. Blank text, as in the empty
+    DataArrays written by VTK, gives an empty array (np.fromstring would return [-1] or [0])."""
+    dtype = np.dtype(dtype).newbyteorder('=')
+    if not text.strip():
+        return np.empty(0, dtype=dtype)
+    return np.fromstring(text, dtype=dtype, sep=' ')
+
+
+def parse_vtk_xml_polydata(filename):
+    """Decode a VTK XML PolyData (vtp) file with numpy only.
+    Handles ascii, inline base64 and appended raw or base64 data, optionally zlib compressed.
+    Parameters
+    ----------
+    filename : vtp file
+    Returns
+    -------
+    pieces   : list of dicts, one per Piece, with 'points' (N, 3), 'point_data' and 'cell_data'
+               (LazyArrays from array name to array, decoded on first access) and, when present,
+               'verts', 'lines', 'strips' and 'polys' as (connectivity, offsets) pairs
+    """
+    with open(filename, 'rb') as fid:
+        content = fid.read()
+
+    appended_start = content.find(b'<AppendedData')
+    head = content if appended_start == -1 else content[:appended_start]
+    raw = None
+    raw_base64 = False
+    if appended_start != -1:
+        tag_end = content.index(b'>', appended_start)
+        attrs = dict(XML_ATTRIBUTE_REGEX.findall(content[appended_start:tag_end]))
+        raw_base64 = attrs.get(b'encoding', b'raw') == b'base64'
+        data_start = content.index(b'_', tag_end) + 1
+        data_end = content.rfind(b'</AppendedData>')
+        raw = memoryview(content)[data_start:data_end if data_end != -1 else len(content)]
+
+    vtkfile = VTP_TAG_REGEX.search(head)
+    attrs = dict(XML_ATTRIBUTE_REGEX.findall(vtkfile.group(3)))
+    if attrs.get(b'type', b'PolyData') != b'PolyData':
+        raise NotImplementedError('Not a PolyData file: ' + filename)
+    byte_order = '>' if attrs.get(b'byte_order', b'LittleEndian') == b'BigEndian' else '<'
+    header_dtype = byte_order + ('u8' if attrs.get(b'header_type', b'UInt32') == b'UInt64' else 'u4')
+    compressor = attrs.get(b'compressor', b'')
+    if compressor not in (b'', b'vtkZLibDataCompressor'):
+        raise NotImplementedError('Compressor ' + compressor.decode() + ' is not supported')
+    compressed = compressor != b''
+
+    # Collect the DataArray descriptions first, so that appended base64 arrays know where they end
+    pieces = []
+    descriptions = []
+    section = None
+    for match in VTP_TAG_REGEX.finditer(head):
+        closing, tag, tag_attrs, self_closing = match.groups()
+        if tag == b'Piece' and not closing:
+            pieces.append({'points': None, 'point_data': LazyArrays(), 'cell_data': LazyArrays()})
+        elif tag in (b'Points', b'PointData', b'CellData') or tag in VTP_CELL_SECTIONS:
+            section = None if closing else tag
+        elif tag == b'DataArray' and not closing and section is not None:
+            tag_attrs = dict(XML_ATTRIBUTE_REGEX.findall(tag_attrs))
+            text = None
+            if not self_closing:
+                # The data runs up to the closing tag or to nested InformationKey elements
+                text = head[match.end():head.index(b'<', match.end())]
+            descriptions.append((pieces[-1], section, tag_attrs, text))
+
+    appended_offsets = sorted(int(a[b'offset']) for p, s, a, t in descriptions
+                              if a.get(b'format') == b'appended')
+
+    def decode(tag_attrs, text):
+        dtype = np.dtype(VTK_XML_DTYPES[tag_attrs[b'type'].decode()]).newbyteorder(byte_order)
+        fmt = tag_attrs.get(b'format', b'ascii')
+        if fmt == b'ascii':
+            array = parse_ascii_values(text.decode('ascii'), dtype)
+        elif fmt == b'binary':
+            array = np.frombuffer(_decode_base64_array(text, header_dtype, compressed), dtype=dtype)
+        elif fmt == b'appended':
+            offset = int(tag_attrs[b'offset'])
+            if raw_base64:
+                following = [o for o in appended_offsets if o > offset]
+                end = following[0] if following else len(raw)
+                data = _decode_base64_array(raw[offset:end].tobytes(), header_dtype, compressed)
+            else:
+                data = _decode_appended_raw(raw, offset, header_dtype, compressed)
+            array = np.frombuffer(data, dtype=dtype)
+        else:
+            raise NotImplementedError('DataArray format ' + fmt.decode() + ' is not supported')
+
+        ncomp = int(tag_attrs.get(b'NumberOfComponents', b'1'))
+        if ncomp > 1:
+            array = array.reshape(-1, ncomp)
+        return array
+
+    for piece, section, tag_attrs, text in descriptions:
+        name = tag_attrs.get(b'Name', b'').decode()
+        if section == b'Points':
+            piece['points'] = decode(tag_attrs, text)
+        elif section == b'PointData':
+            piece['point_data'].add(name, functools.partial(decode, tag_attrs, text))
+        elif section == b'CellData':
+            piece['cell_data'].add(name, functools.partial(decode, tag_attrs, text))
+        else:
+            cells = VTP_CELL_SECTIONS[section]
+            connectivity, offsets = piece.get(cells, (None, None))
+            if name == 'connectivity':
+                connectivity = decode(tag_attrs, text)
+            elif name == 'offsets':
+                offsets = decode(tag_attrs, text)
+            piece[cells] = (connectivity, offsets)
+    return pieces
+
+
+def legacy_cells_to_offsets(cells, ncells):
+    """Convert a legacy VTK cell array [n, i1, ..., in, n, ...] to (connectivity, offsets).
+    Cells of a single size are split with a reshape. For mixed sizes the cell starts are found by
+    repeatedly doubling jumps of n + 1 positions, which takes log2(ncells) vectorized steps.
+    """
+    cells = np.asarray(cells)
+    if ncells == 0:
+        return cells[:0], np.zeros(0, dtype='int64')
+    if len(cells) % ncells == 0:
+        width = len(cells) // ncells
+        table = cells.reshape(ncells, width)
+        if (table[:, 0] == width - 1).all():
+            return table[:, 1:].ravel(), np.arange(width - 1, len(cells) - ncells + 1, width - 1)
+
+    length = len(cells)
+    jump = np.append(np.clip(np.arange(length) + cells.astype('int64') + 1, 0, length), length)
+    starts = np.zeros(1, dtype='int64')
+    while len(starts) < ncells:
+        starts = np.concatenate([starts, jump[starts]])
+        jump = jump[jump]
+    starts = starts[:ncells]
+    mask = np.ones(length, dtype=bool)
+    mask[starts] = False
+    return cells[mask], np.cumsum(cells[starts])
+
+
+def cells_to_triangles(connectivity, offsets):
+    """Return the (N, 3) triangles of a cell array given as connectivity and end offsets.
+    A mesh made only of triangles is validated with one vectorized check and returned as a
+    reshaped view of connectivity. Other polygons are split into fans of triangles, all at once.
+    """
+    connectivity = np.asarray(connectivity)
+    offsets = np.asarray(offsets)
+    sizes = np.diff(np.concatenate([[0], offsets]))
+    if (sizes == 3).all():
+        return connectivity[:3 * len(offsets)].reshape(-1, 3)
+
+    ntriangles = np.maximum(sizes - 2, 0)
+    starts = np.repeat(offsets - sizes, ntriangles)
+    fan = np.arange(ntriangles.sum()) - np.repeat(np.cumsum(ntriangles) - ntriangles, ntriangles)
+    return np.column_stack([connectivity[starts], connectivity[starts + fan + 1], connectivity[starts + fan + 2]])
+
+
+def legacy_cells_to_triangles(cells, ncells):
+    """Return the (N, 3) triangles of a legacy VTK cell array [n, i1, ..., in, n, ...].
+    For an all-triangle mesh the result is a strided view of the cell array, without a copy."""
+    cells = np.asarray(cells)
+    if len(cells) == 4 * ncells:
+        table = cells.reshape(ncells, 4)
+        if (table[:, 0] == 3).all():
+            return table[:, 1:]
+    return cells_to_triangles(*legacy_cells_to_offsets(cells, ncells))
+
+
+def vtk_cells_to_triangles(cellarray):
+    """Return the (N, 3) triangles of a vtkCellArray, from its connectivity and offsets arrays
+    when VTK provides them (VTK >= 9) or from the legacy cell layout otherwise."""
+    from vtk.util import numpy_support
+    if hasattr(cellarray, 'GetConnectivityArray'):
+        connectivity = numpy_support.vtk_to_numpy(cellarray.GetConnectivityArray())
+        offsets = numpy_support.vtk_to_numpy(cellarray.GetOffsetsArray())
+        return cells_to_triangles(connectivity, offsets[1:])
+    return legacy_cells_to_triangles(numpy_support.vtk_to_numpy(cellarray.GetData()),
+                                     cellarray.GetNumberOfCells())
+
+
+def parse_vtk_polydata(filename):
+    """Decode a legacy VTK (.vtk) POLYDATA file in ASCII or BINARY format with numpy only.
+    Returns a dict with the same keys as the pieces of parse_vtk_xml_polydata.
+    """
+    with open(filename, 'rb') as fid:
+        buf = fid.read()
+
+    def next_line(pos):
+        while True:
+            end = buf.find(b'\n', pos)
+            if end == -1:
+                end = len(buf)
+            line = buf[pos:end].strip()
+            pos = end + 1
+            if line or pos >= len(buf):
+                return line.decode('latin-1'), pos
+
+    def decode(start, end, dtype, count, shape):
+        if binary:
+            values = np.frombuffer(buf, dtype=np.dtype(dtype).newbyteorder('>'), count=count, offset=start)
+        else:
+            values = parse_ascii_values(buf[start:end].decode('latin-1'), dtype)
+            if len(values) != count:
+                raise ValueError('Expected {0} values, found {1} in {2}'.format(count, len(values), filename))
+        return values.reshape(shape) if shape else values
+
+    def read_values(pos, dtype, count, shape=None, lazy=False):
+        # Locate the values starting at pos and decode them, now or on first access if lazy
+        if binary:
+            end = pos + count * np.dtype(dtype).itemsize
+            next_pos = end + 1 if buf[end:end + 1] == b'\n' else end
+        else:
+            match = LEGACY_KEYWORD_REGEX.search(buf, pos)
+            end = next_pos = match.start() if match else len(buf)
+        if lazy:
+            return functools.partial(decode, pos, end, dtype, count, shape), next_pos
+        return decode(pos, end, dtype, count, shape), next_pos
+
+    def skip_metadata(pos):
+        # Array information written by newer VTK versions, runs up to the next blank line
+        end = buf.find(b'\n\n', pos)
+        return len(buf) if end == -1 else end + 2
+
+    line, pos = next_line(0)
+    if not line.startswith('# vtk DataFile'):
+        raise ValueError('File ' + filename + ' is not a legacy VTK file')
+    title, pos = next_line(pos)
+    fmt, pos = next_line(pos)
+    binary = fmt.upper() == 'BINARY'
+    dataset, pos = next_line(pos)
+    if dataset.split()[-1].upper() != 'POLYDATA':
+        raise NotImplementedError('Only POLYDATA legacy VTK files are supported')
+
+    piece = {'points': None, 'point_data': LazyArrays(), 'cell_data': LazyArrays()}
+    cell_keywords = {'VERTICES': 'verts', 'LINES': 'lines', 'POLYGONS': 'polys', 'TRIANGLE_STRIPS': 'strips'}
+    data = None
+    ntuples = 0
+    while pos < len(buf):
+        line, pos = next_line(pos)
+        tokens = line.split()
+        if not tokens:
+            break
+        keyword = tokens[0].upper()
+        if keyword == 'POINTS':
+            npoints = int(tokens[1])
+            piece['points'], pos = read_values(pos, VTK_LEGACY_DTYPES[tokens[2]], 3 * npoints, (npoints, 3))
+        elif keyword in cell_keywords:
+            ncells, size = int(tokens[1]), int(tokens[2])
+            line, next_pos = next_line(pos)
+            if line.upper().startswith('OFFSETS'):
+                # VTK 5.1 layout, offsets (with a leading 0) followed by connectivity
+                offsets, pos = read_values(next_pos, VTK_LEGACY_DTYPES[line.split()[1]], ncells)
+                line, pos = next_line(pos)
+                connectivity, pos = read_values(pos, VTK_LEGACY_DTYPES[line.split()[1]], size)
+                piece[cell_keywords[keyword]] = (connectivity, offsets[1:])
+            else:
+                cells, pos = read_values(pos, 'i4', size)
+                piece[cell_keywords[keyword]] = legacy_cells_to_offsets(cells, ncells)
+        elif keyword in ('POINT_DATA', 'CELL_DATA'):
+            data = piece['point_data'] if keyword == 'POINT_DATA' else piece['cell_data']
+            ntuples = int(tokens[1])
+        elif keyword == 'SCALARS':
+            ncomp = int(tokens[3]) if len(tokens) > 3 else 1
+            line, pos = next_line(pos)  # LOOKUP_TABLE
+            decoder, pos = read_values(pos, VTK_LEGACY_DTYPES[tokens[2]], ntuples * ncomp,
+                                       (ntuples, ncomp) if ncomp > 1 else None, lazy=True)
+            data.add(tokens[1], decoder)
+        elif keyword in ('VECTORS', 'NORMALS'):
+            decoder, pos = read_values(pos, VTK_LEGACY_DTYPES[tokens[2]], ntuples * 3, (ntuples, 3), lazy=True)
+            data.add(tokens[1], decoder)
+        elif keyword == 'TEXTURE_COORDINATES':
+            ncomp = int(tokens[2])
+            decoder, pos = read_values(pos, VTK_LEGACY_DTYPES[tokens[3]], ntuples * ncomp, (ntuples, ncomp), lazy=True)
+            data.add(tokens[1], decoder)
+        elif keyword == 'FIELD':
+            for ii in range(int(tokens[2])):
+                line, pos = next_line(pos)
+                while line.upper().startswith('METADATA'):
+                    pos = skip_metadata(pos)
+                    line, pos = next_line(pos)
+                name, ncomp, count, dtype = line.split()[:4]
+                ncomp, count = int(ncomp), int(count)
+                decoder, pos = read_values(pos, VTK_LEGACY_DTYPES[dtype], ncomp * count,
+                                           (count, ncomp) if ncomp > 1 else None, lazy=True)
+                data.add(name, decoder)
+        elif keyword == 'METADATA':
+            pos = skip_metadata(pos)
+        else:
+            raise NotImplementedError('Legacy VTK keyword ' + keyword + ' is not supported')
+    return piece
+
+
+def _merge_pieces(pieces):
+    """Merge the pieces of a vtp file into one, shifting the cell connectivity of every piece."""
+    if len(pieces) == 1:
+        return pieces[0]
+    merged = {'points': np.concatenate([piece['points'] for piece in pieces]),
+              'point_data': LazyArrays(), 'cell_data': LazyArrays()}
+    for key in ('point_data', 'cell_data'):
+        names = [name for name in pieces[0][key] if all(name in piece[key] for piece in pieces)]
+        for name in names:
+            merged[key].add(name, functools.partial(lambda key, name: np.concatenate([piece[key][name] for piece in pieces]),
+                                                    key, name))
+    npoints = np.cumsum([0] + [len(piece['points']) for piece in pieces])
+    for cells in ('verts', 'lines', 'strips', 'polys'):
+        if any(cells in piece for piece in pieces):
+            connectivity = [piece[cells][0] + shift for piece, shift in zip(pieces, npoints) if cells in piece]
+            sizes = [piece[cells][0].size for piece in pieces if cells in piece]
+            offsets = [piece[cells][1] + shift for piece, shift in zip([p for p in pieces if cells in p],
+                                                                     np.cumsum([0] + sizes))]
+            merged[cells] = (np.concatenate(connectivity), np.concatenate(offsets))
+    return merged
+
+
+def _writable(array):
+    """Return an array the caller owns, copying read-only views into a file buffer."""
+    if isinstance(array, np.ndarray) and not array.flags.writeable:
+        return array.copy()
+    return array
+
+
+def ReadVTK_XML_Polydata(vtkfile):
+    """Read a triangulated surface from a vtp file with numpy, falling back to VTK for files
+    that the numpy reader cannot decode.
+    Returns coords, faces, attributes (VoxelData or the first point array) and labels (VertexLabel).
+    """
+    try:
+        piece = _merge_pieces(parse_vtk_xml_polydata(vtkfile))
+        coords = piece['points']
+        faces = cells_to_triangles(*piece['polys']) if 'polys' in piece else np.empty((0, 3), 'int32')
+
+        pointdata = piece['point_data']
+        attributes = []
+        labels = []
+        if len(pointdata):
+            if 'VoxelData' in pointdata:  # If VoxelData present use it or else pick the first array
+                attributes = pointdata['VoxelData']
+            else:
+                attributes = pointdata[list(pointdata.keys())[0]]
+            if 'VertexLabel' in pointdata:
+                labels = pointdata['VertexLabel']
+    except NATIVE_READER_ERRORS:
+        return ReadVTK_XML_Polydata_vtk(vtkfile)
+    return _writable(coords), _writable(faces), _writable(attributes), _writable(labels)
+
+
+def ReadVTK_XML_Polydata_lines(vtkfile):
+    """Read the polylines of a vtp file with numpy into a ragged buffer, one line after the other.
+    Returns
+    -------
+    coords     : (N, 3) array of the points of all lines, points shared by lines are repeated
+    offsets    : int64 array (nLines + 1,), line i is coords[offsets[i]:offsets[i+1]]
+    point_data : OrderedDict of the point arrays, gathered in the same order as coords
+    Files without lines, such as surfaces, give (0, 3) coords and offsets [0]. Levels without points
+    written by write_multilevel_polyline_to_vtp are read back as empty lines.
+    """
+    piece = _merge_pieces(parse_vtk_xml_polydata(vtkfile))
+    points = np.asarray(piece['points'])
+    if 'lines' in piece:
+        connectivity, ends = piece['lines']
+    else:
+        connectivity, ends = np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+    offsets = np.zeros(len(ends) + 1, dtype='int64')
+    offsets[1:] = ends
+
+    # Files written by shapeio store the points of each line in order, no gather is needed
+    if len(connectivity) == len(points) and np.array_equal(connectivity, np.arange(len(points))):
+        connectivity = slice(None)
+    point_data = OrderedDict((name, _writable(np.asarray(piece['point_data'][name])[connectivity]))
+                             for name in piece['point_data'])
+    return _writable(points[connectivity]), offsets, point_data
+
 
-    coords = coords.copy()  # To ensure C_CONTIGUOUS is True
+def _vtk_arrays(fielddata):
+    """Return a LazyArrays of the arrays of vtkPointData or vtkCellData."""
+    from vtk.util import numpy_support
+    arrays = LazyArrays()
+    for ii in range(fielddata.GetNumberOfArrays()):
+        array = fielddata.GetAbstractArray(ii)
+        arrays.add(array.GetName(), functools.partial(numpy_support.vtk_to_numpy, array))
+    return arrays
+
+
+def _read_polydata_arrays_vtk(vtkfile, reader):
+    reader.SetFileName(vtkfile)
+    reader.Update()
+    mesh = reader.GetOutput()
+    from vtk.util import numpy_support
+    coords = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
+    faces = vtk_cells_to_triangles(mesh.GetPolys())
+    return coords, faces, _vtk_arrays(mesh.GetPointData()), _vtk_arrays(mesh.GetCellData())
+
+
+def ReadVTK_XML_Polydata_arrays(vtkfile):
+    """Read a surface and all its named point and cell arrays from a vtp file with a single parse.
+    Returns
+    -------
+    coords     : array (N, 3)
+    faces      : array (F, 3)
+    point_data : LazyArrays, a mapping from array name to per-vertex array, decoded on first access
+    cell_data  : LazyArrays, a mapping from array name to per-cell array, decoded on first access
+    Both mappings can be passed to WriteVTK_XML_Polydata to write all the arrays back in one pass.
+    Arrays stored as binary or appended data are read-only views into the file buffer, copy them
+    (np.array(a)) before editing them in place. ReadVTK_XML_Polydata returns writable arrays.
+    """
+    try:
+        piece = _merge_pieces(parse_vtk_xml_polydata(vtkfile))
+        faces = cells_to_triangles(*piece['polys']) if 'polys' in piece else np.empty((0, 3), 'int32')
+        return piece['points'], faces, piece['point_data'], piece['cell_data']
+    except NATIVE_READER_ERRORS:
+        import vtk
+        return _read_polydata_arrays_vtk(vtkfile, vtk.vtkXMLPolyDataReader())
+
+
+def ReadVTK_Polydata_arrays(vtkfile):
+    """Read a surface and all its named point and cell arrays from a legacy vtk file with a single parse.
+    Returns coords, faces, point_data and cell_data as ReadVTK_XML_Polydata_arrays.
+    Arrays of BINARY files are read-only views into the file buffer, copy them (np.array(a)) before
+    editing them in place. ReadVTK_Polydata returns writable arrays.
+    """
+    try:
+        piece = parse_vtk_polydata(vtkfile)
+        faces = cells_to_triangles(*piece['polys']) if 'polys' in piece else np.empty((0, 3), 'int32')
+        return piece['points'], faces, piece['point_data'], piece['cell_data']
+    except NATIVE_READER_ERRORS:
+        import vtk
+        return _read_polydata_arrays_vtk(vtkfile, vtk.vtkPolyDataReader())
+
+
+def ReadVTK_Polydata(vtkfile):
+    """Read a triangulated surface from a legacy vtk file with numpy, falling back to VTK for files
+    that the numpy reader cannot decode.
+    Returns coords, faces and attributes (the first point array unless it holds the normals).
+    """
+    try:
+        piece = parse_vtk_polydata(vtkfile)
+        coords = piece['points']
+        faces = cells_to_triangles(*piece['polys']) if 'polys' in piece else np.empty((0, 3), 'int32')
+
+        pointdata = piece['point_data']
+        attributes = []
+        if len(pointdata):  # Attributes present
+            name = list(pointdata.keys())[0]
+            if name != 'normals':
+                attributes = pointdata[name]
+    except NATIVE_READER_ERRORS:
+        return ReadVTK_Polydata_vtk(vtkfile)
+    return _writable(coords), _writable(faces), _writable(attributes)
+
+
+def _vtk_polylines(coords_list, attributes_list=None):
+    """Build a vtkPolyData with one polyline per array in coords_list.
+    The points and the line connectivity are passed to VTK as whole numpy arrays."""
+    import vtk
+    from vtk.util import numpy_support
+
+    coords = np.ascontiguousarray(np.concatenate(coords_list), dtype='float32')
+    sizes = np.array([len(c) for c in coords_list], dtype='int64')
+    id_dtype = numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+    offsets = np.zeros(len(sizes) + 1, dtype=id_dtype)
+    np.cumsum(sizes, out=offsets[1:])
+    connectivity = np.arange(len(coords), dtype=id_dtype)
 
     polydata = vtk.vtkPolyData()
     points = vtk.vtkPoints()
-
-    points.SetData(numpy_support.numpy_to_vtk(coords))
+    points.SetData(numpy_support.numpy_to_vtk(coords, deep=1))
     polydata.SetPoints(points)
 
     lines = vtk.vtkCellArray()
-    lines.InsertNextCell(coords.shape[0])
-    for i in np.arange(coords.shape[0]):
-        lines.InsertCellPoint(i)
-
+    if hasattr(lines, 'GetConnectivityArray'):
+        lines.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=1),
+                      numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=1))
+    else:
+        # Legacy cell layout [n, i1, ..., in, n, ...]
+        legacy = np.empty(len(connectivity) + len(sizes), dtype=id_dtype)
+        starts = offsets[:-1] + np.arange(len(sizes))
+        legacy[starts] = sizes
+        mask = np.ones(len(legacy), dtype=bool)
+        mask[starts] = False
+        legacy[mask] = connectivity
+        lines.SetCells(len(sizes), numpy_support.numpy_to_vtkIdTypeArray(legacy, deep=1))
     polydata.SetLines(lines)
 
+    if attributes_list is not None and len(attributes_list) == len(coords_list) and \
+            all(len(a) == n for a, n in zip(attributes_list, sizes)):
+        attributes = numpy_support.numpy_to_vtk(np.concatenate(attributes_list).astype('float32'), deep=1)
+        attributes.SetName('Attributes')
+        polydata.GetPointData().SetScalars(attributes)
+    return polydata
+
+
+def _write_vtk_xml_polydata(filename, polydata, data_mode, compress):
+    import vtk
+
     writer = vtk.vtkXMLPolyDataWriter()
     writer.SetInputData(polydata)
     writer.SetFileName(filename)
-    writer.SetDataModeToAscii()
+    if data_mode == 'ascii':
+        writer.SetDataModeToAscii()
+    elif data_mode == 'binary':
+        writer.SetDataModeToBinary()
+    elif data_mode == 'appended':
+        writer.SetDataModeToAppended()
+        writer.EncodeAppendedDataOff()
+    else:
+        raise ValueError('Unknown VTP data mode ' + data_mode + '. Use ascii, binary or appended.')
+    if compress:
+        writer.SetCompressorTypeToZLib()
+    else:
+        writer.SetCompressorTypeToNone()
     writer.Write()
 
-def write_vtk_xml_polydata_curve_set(filename, coords_set, attributes=[]):
-    levels = len(coords_set)
-
-    vtkmultipieceobj = vtk.vtkMultiPieceDataSet()
-    vtkmultipieceobj.SetNumberOfPieces(levels)
-
-    for ii in np.arange(levels):
-
-        coords = coords_set[ii]
 
-        if coords.shape[0] < coords.shape[1]:
-            coords = coords.T
+def tall_coords(coords):
+    """Return coords as (N, 3), transposing curves stored as (3, N)."""
+    coords = np.asarray(coords)
+    if coords.ndim == 2 and coords.shape[1] != 3 and coords.shape[0] == 3:
+        coords = coords.T
+    return coords
 
-        coords = coords.copy()  # To ensure C_CONTIGUOUS is True
 
-        polydata = vtk.vtkPolyData()
-        points = vtk.vtkPoints()
+def write_vtk_xml_polydata_curve(filename, coords, attributes=[], data_mode='ascii', compress=False):
+    """Write a curve as a single polyline to a vtp file with VTK.
+    data_mode is 'ascii', 'binary' or 'appended' (raw); compress enables zlib compression."""
+    attributes_list = [attributes] if len(attributes) else None
+    polydata = _vtk_polylines([tall_coords(coords)], attributes_list)
+    _write_vtk_xml_polydata(filename, polydata, data_mode, compress)
 
-        points.SetData(numpy_support.numpy_to_vtk(coords))
-        polydata.SetPoints(points)
 
-        lines = vtk.vtkCellArray()
-        lines.InsertNextCell(coords.shape[0])
-        for i in np.arange(coords.shape[0]):
-            lines.InsertCellPoint(i)
+def write_vtk_xml_polydata_curve_set(filename, coords_set, attributes=[], data_mode='ascii', compress=False):
+    """Write a set of curves, one polyline per level, to a vtp file with VTK.
+    All levels share one point array, so the cost is about that of writing the coordinates.
+    data_mode is 'ascii', 'binary' or 'appended' (raw); compress enables zlib compression."""
+    attributes_list = attributes if len(attributes) else None
+    polydata = _vtk_polylines([tall_coords(coords) for coords in coords_set], attributes_list)
+    _write_vtk_xml_polydata(filename, polydata, data_mode, compress)
 
-        polydata.SetLines(lines)
-        vtkmultipieceobj.SetPiece(ii, polydata)
 
-    writer = vtk.vtkXMLPolyDataWriter()
-    writer.SetInputData(vtkmultipieceobj)
-    writer.SetFileName(filename)
-    writer.SetDataModeToAscii()
-    writer.Write()
+def write_multilevel_polyline_to_vtp(filename, coords_set, attributes_set=[], encoding='ascii', compress=False):
+    """Write each level of a multilevel curve as one piece with a single polyline.
+    encoding is 'ascii', 'binary' or 'appended'; with 'appended' the points, connectivity, offsets and
+    attributes of all levels are written as raw blocks after the XML, zlib compressed if compress is set.
+    coords_set can also be a CurveSet, whose attributes are written when attributes_set is empty."""
+    from curveset import CurveSet  # curveset imports vtkio
+    if isinstance(coords_set, CurveSet):
+        coords_set, curveset_attributes = coords_set.to_list()
+        if not len(attributes_set):
+            attributes_set = curveset_attributes
+    if encoding != 'ascii':
+        if type(coords_set) != list:
+            coords_set = [coords_set]
+            attributes_set = [attributes_set] if len(attributes_set) > 0 else []
+        pieces = []
+        for ii, coords in enumerate(coords_set):
+            coords = tall_coords(coords)
+            T = coords.shape[0]
+            piece = {'points': coords.astype('float32'),
+                     'lines': (np.arange(T, dtype='int32'), np.array([T], dtype='int32'))}
+            if len(attributes_set) == len(coords_set) and len(attributes_set[ii]) == T:
+                piece['point_data'] = [('Attributes', np.asarray(attributes_set[ii], dtype='float32'))]
+            pieces.append(piece)
+        write_vtk_xml_polydata_pieces(filename, pieces, encoding, compress)
+        return
 
-def write_multilevel_polyline_to_vtp(filename, coords_set, attributes_set=[]):
     attribute_list = None
     if type(coords_set) == list:
         levels = len(coords_set)
@@ -134,8 +771,7 @@ def write_multilevel_polyline_to_vtp(filename, coords_set, attributes_set=[]):
 
     # First format all coords in coords_list to be tall instead of wide
     for ii in np.arange(levels):
-        if coords_list[ii].shape[0] < coords_list[ii].shape[1]:
-            coords_list[ii] = coords_list[ii].T.copy()
+        coords_list[ii] = tall_coords(coords_list[ii])
 
     fid = open(filename, mode='wt')
     fid.write('<?xml version="1.0"?>\n')
@@ -246,3 +882,240 @@ def WriteVTK_XML_Polydata_old(vtkfile, coords, faces, attriblabel, attrib, ascii
     sys.stdout.write("Done.\n")
 
     return None
+
+
+def ascii_text(array, fmt=None, per_line=None):
+    """Format an array as text with a single string formatting call, one row per line, or per_line
+    values a line if given. fmt defaults to '%d' for integer arrays and '%f' otherwise."""
+    array = np.asarray(array)
+    if fmt is None:
+        fmt = '%d' if array.dtype.kind in 'iub' else '%f'
+    if per_line is None:
+        per_line = array.shape[1] if array.ndim > 1 else 1
+    values = array.ravel().tolist()
+    rows, rest = divmod(len(values), per_line)
+    text = (' '.join([fmt] * per_line) + '\n') * rows
+    if rest:
+        text += ' '.join([fmt] * rest) + '\n'
+    return text % tuple(values)
+
+
+def _binary_blocks(array, compress):
+    """Return the header and data bytes of an array in the VTK binary layout (UInt32 headers).
+    Compressed data is stored as a single zlib block."""
+    raw = np.ascontiguousarray(array).tobytes()
+    if not compress:
+        return np.array([len(raw)], dtype='<u4').tobytes(), raw
+    if not raw:
+        return np.array([0, 0, 0], dtype='<u4').tobytes(), b''
+    data = zlib.compress(raw)
+    return np.array([1, len(raw), len(raw), len(data)], dtype='<u4').tobytes(), data
+
+
+class _VTPDataArrays(object):
+    """Encodes the DataArray elements of a VTK XML file and collects the appended data."""
+
+    def __init__(self, encoding, compress):
+        if encoding not in ('ascii', 'binary', 'appended'):
+            raise ValueError('Unknown VTP encoding ' + encoding + '. Use ascii, binary or appended.')
+        self.encoding = encoding
+        self.compress = compress and encoding != 'ascii'
+        self.appended = []
+        self.offset = 0
+
+    def xml(self, array, name=None, ncomp=1):
+        array = np.asarray(array)
+        if array.dtype.name not in VTK_XML_TYPES:
+            array = array.astype('float32')
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        attrs = 'type="{0}"'.format(VTK_XML_TYPES[array.dtype.name])
+        if name is not None:
+            attrs += ' Name="{0}"'.format(name)
+        if ncomp > 1:
+            attrs += ' NumberOfComponents="{0}"'.format(ncomp)
+
+        if self.encoding == 'ascii':
+            return '<DataArray {0} format="ascii">\n{1}</DataArray>\n'.format(attrs, ascii_text(array))
+
+        header, data = _binary_blocks(array, self.compress)
+        if self.encoding == 'binary':
+            if self.compress:
+                text = base64.b64encode(header) + base64.b64encode(data)
+            else:
+                text = base64.b64encode(header + data)
+            return '<DataArray {0} format="binary">\n{1}\n</DataArray>\n'.format(attrs, text.decode('ascii'))
+
+        self.appended.append(header)
+        self.appended.append(data)
+        tag = '<DataArray {0} format="appended" offset="{1}"/>\n'.format(attrs, self.offset)
+        self.offset += len(header) + len(data)
+        return tag
+
+
+def write_vtk_xml_polydata_pieces(filename, pieces, encoding='binary', compress=False):
+    """Write one or more pieces of polygonal data to a VTK XML PolyData (vtp) file.
+    Parameters
+    ----------
+    filename : vtp file
+    pieces   : list of dicts with 'points' (N, 3) and optionally 'point_data' and 'cell_data', mappings or
+               lists of (name, array) pairs, and 'verts', 'lines', 'strips', 'polys', (connectivity, offsets) pairs
+    encoding : 'ascii', 'binary' (inline base64) or 'appended' (raw bytes after the XML)
+    compress : zlib compress the binary and appended arrays
+    """
+    arrays = _VTPDataArrays(encoding, compress)
+    xml = ['<?xml version="1.0"?>\n']
+    if arrays.compress:
+        xml.append('<VTKFile type="PolyData" version="0.1" byte_order="LittleEndian" '
+                   'compressor="vtkZLibDataCompressor">\n')
+    else:
+        xml.append('<VTKFile type="PolyData" version="0.1" byte_order="LittleEndian">\n')
+    xml.append('<PolyData>\n')
+
+    for piece in pieces:
+        points = np.asarray(piece['points'])
+        counts = dict((cells, len(piece[cells][1]) if cells in piece else 0)
+                      for cells in ('verts', 'lines', 'strips', 'polys'))
+        xml.append('<Piece NumberOfPoints="{0}" NumberOfVerts="{1}" NumberOfLines="{2}" NumberOfStrips="{3}" '
+                   'NumberOfPolys="{4}">\n'.format(points.shape[0], counts['verts'], counts['lines'],
+                                                    counts['strips'], counts['polys']))
+        for section, key in (('PointData', 'point_data'), ('CellData', 'cell_data')):
+            data = piece.get(key, [])
+            if isinstance(data, Mapping):
+                data = list(data.items())
+            if len(data):
+                xml.append('<{0} Scalars="{1}">\n'.format(section, data[0][0]))
+                for name, array in data:
+                    array = np.asarray(array)
+                    ncomp = array.shape[1] if array.ndim > 1 else 1
+                    xml.append(arrays.xml(array, name, ncomp))
+                xml.append('</{0}>\n'.format(section))
+        xml.append('<Points>\n')
+        xml.append(arrays.xml(points, None, 3))
+        xml.append('</Points>\n')
+        for cells, section in (('verts', 'Verts'), ('lines', 'Lines'), ('strips', 'Strips'), ('polys', 'Polys')):
+            if cells in piece:
+                connectivity, offsets = piece[cells]
+                xml.append('<{0}>\n'.format(section))
+                xml.append(arrays.xml(connectivity, 'connectivity'))
+                xml.append(arrays.xml(offsets, 'offsets'))
+                xml.append('</{0}>\n'.format(section))
+        xml.append('</Piece>\n')
+
+    xml.append('</PolyData>\n')
+    with open(filename, 'wb') as fid:
+        if encoding == 'appended':
+            xml.append('<AppendedData encoding="raw">\n_')
+            fid.write(''.join(xml).encode('ascii'))
+            fid.write(b''.join(arrays.appended))
+            fid.write(b'\n</AppendedData>\n</VTKFile>\n')
+        else:
+            xml.append('</VTKFile>\n')
+            fid.write(''.join(xml).encode('ascii'))
+
+
+def WriteVTK_XML_Polydata(vtkfile, coords, faces, attriblabel='', attrib=[], encoding='binary', compress=False,
+                          cell_data=None):
+    """Write a triangulated surface to a vtp file.
+    Every array is encoded in one vectorized step, as ascii text, inline base64 ('binary') or
+    raw bytes appended after the XML ('appended'), optionally zlib compressed.
+    attrib is either one per-vertex array, stored under attriblabel, or a mapping from names to
+    per-vertex arrays such as the point_data of ReadVTK_XML_Polydata_arrays. cell_data is an
+    optional mapping from names to per-face arrays.
+    """
+    sys.stdout.write('Writing vtp file ' + vtkfile + '...')
+    coords = np.asarray(coords)
+    faces = np.asarray(faces)
+
+    if isinstance(attrib, Mapping):
+        for name, array in attrib.items():
+            if len(array) != coords.shape[0]:
+                print("Attribute " + name + " length " + str(len(array)) + " not the same as the length of coordinate vertices " + str(coords.shape[0]) + ". Not saving file")
+                return None
+    elif len(attrib) > 0 and len(attrib) != coords.shape[0]:
+        print("Attribute length " + str(len(attrib)) + " not the same as the length of coordinate vertices " + str(coords.shape[0]) + ". Not saving file")
+        return None
+
+    if faces.size and faces.min() == 1:
+        faces = faces - 1
+
+    piece = {'points': coords.astype('float32'),
+             'polys': (faces.astype('int32').ravel(), np.arange(3, 3 * faces.shape[0] + 3, 3, dtype='int32')),
+             }
+    if isinstance(attrib, Mapping):
+        piece['point_data'] = attrib
+    elif len(attrib) > 0:
+        if attriblabel == "":
+            attriblabel = "attrib-label"
+        piece['point_data'] = [(attriblabel, np.asarray(attrib, dtype='float32'))]
+    if cell_data is not None:
+        piece['cell_data'] = cell_data
+
+    write_vtk_xml_polydata_pieces(vtkfile, [piece], encoding, compress)
+    sys.stdout.write("Done.\n")
+    return None
+
+
+def WriteVTK_Polydata(vtkfile, coords, faces, attriblabel='', attrib=[], binary=True):
+    """Write a triangulated surface to a legacy VTK (.vtk) POLYDATA file without VTK.
+    In binary mode the points, polygons and point data are written as big-endian buffers, one write each.
+    attrib is either one per-vertex array, stored under attriblabel, or a mapping from names to
+    per-vertex arrays. The first array is written as SCALARS if it has 1 to 4 components, the others
+    in a FIELD.
+    """
+    sys.stdout.write('Writing vtk file ' + vtkfile + '...')
+    coords = np.asarray(coords)
+    faces = np.asarray(faces)
+
+    if isinstance(attrib, Mapping):
+        point_data = list(attrib.items())
+    elif len(attrib) > 0:
+        point_data = [(attriblabel if attriblabel != "" else "attrib-label", attrib)]
+    else:
+        point_data = []
+    for name, array in point_data:
+        if len(array) != coords.shape[0]:
+            print("Attribute " + name + " length " + str(len(array)) + " not the same as the length of coordinate vertices " + str(coords.shape[0]) + ". Not saving file")
+            return None
+
+    if faces.size and faces.min() == 1:
+        faces = faces - 1
+
+    def block(array):
+        array = np.asarray(array)
+        if array.dtype.name not in VTK_LEGACY_TYPES:
+            array = array.astype('float32')
+        if binary:
+            return array.astype(array.dtype.newbyteorder('>')).tobytes() + b'\n'
+        return ascii_text(array).encode('ascii')
+
+    def legacy_type(array):
+        return VTK_LEGACY_TYPES.get(np.asarray(array).dtype.name, 'float')
+
+    polygons = np.column_stack([np.full(len(faces), 3, dtype='int32'), faces.astype('int32')])
+    with open(vtkfile, 'wb') as fid:
+        fid.write('# vtk DataFile Version 3.0\nvtk output\n{0}\nDATASET POLYDATA\nPOINTS {1} {2}\n'.format(
+            'BINARY' if binary else 'ASCII', coords.shape[0], legacy_type(coords)).encode('ascii'))
+        fid.write(block(coords))
+        fid.write('POLYGONS {0} {1}\n'.format(len(faces), polygons.size).encode('ascii'))
+        fid.write(block(polygons))
+
+        if point_data:
+            fid.write('POINT_DATA {0}\n'.format(coords.shape[0]).encode('ascii'))
+            fields = []
+            for name, array in point_data:
+                array = np.asarray(array)
+                ncomp = array.shape[1] if array.ndim > 1 else 1
+                fields.append((name.replace(' ', '_'), array, ncomp))
+            # vtkPolyDataReader only reads the first SCALARS section by default, so only the first
+            # array is written as SCALARS and the others go in one FIELD block, which is read in full
+            if fields[0][2] <= 4:
+                name, array, ncomp = fields.pop(0)
+                fid.write('SCALARS {0} {1} {2}\nLOOKUP_TABLE default\n'.format(name, legacy_type(array), ncomp).encode('ascii'))
+                fid.write(block(array))
+            if fields:
+                fid.write('FIELD FieldData {0}\n'.format(len(fields)).encode('ascii'))
+                for name, array, ncomp in fields:
+                    fid.write('{0} {1} {2} {3}\n'.format(name, ncomp, len(array), legacy_type(array)).encode('ascii'))
+                    fid.write(block(array))
+    sys.stdout.write("Done.\n")
+    return None